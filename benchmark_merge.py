@@ -0,0 +1,454 @@
+"""merge_excel 性能基准
+
+用法：
+    python benchmark_merge.py concat --sheets 250 500 1000 2000 4000
+    python benchmark_merge.py write --rows 100000 200000
+    python benchmark_merge.py generate 输出目录 --files 20 --sheets 3 --rows 2000
+    python benchmark_merge.py pipeline --files 20 --sheets 3 --rows 2000 --output result.json
+    python benchmark_merge.py readers --files 20 --sheets 3 --rows 2000
+    python benchmark_merge.py specs --rows 100000 1000000
+
+pipeline 会生成合成的输入工作簿（也可用 --input 指定已生成的目录），分阶段计时：
+read、concat、classify、各材料处理函数和 write，输出 JSON：每个阶段的耗时、行/秒，
+以及整个进程的峰值内存。加 --trace-memory 时用 tracemalloc 统计每个阶段的内存峰值，
+tracemalloc 会让计时变慢数倍，且不包括 -j 大于 1 时子进程中的读取。
+
+readers 用每个可用的读取后端读取同一批工作簿并比较读取耗时，同时检查各后端合并出的
+明细和全部输出工作表是否完全一致，不一致时退出码为 1。
+
+specs 测量扁钢长度解析在大规格列上的吞吐量，与旧的整列拆分实现对照并检查结果一致。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from material_catalog import load_catalog
+from material_types import MATERIAL_TYPES, SURFACE_TREATMENTS
+from merge_excel import (HAS_CALAMINE, MATERIAL_PROCESSORS, _process_material,
+                         aggregate_materials, build_output_sheets, concat_frames,
+                         flat_bar_lengths, merge_frames, read_excel_files,
+                         split_surface_treatments, write_sheets)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _make_sheets(count, rows):
+    frame = pd.DataFrame({
+        '序号': range(rows),
+        '规格': ['FB-40X4-1000'] * rows,
+        '数量': [1] * rows,
+        '表面处理': ['Y'] * rows,
+        '是否带腹板': ['否'] * rows,
+    })
+    return [frame.copy() for _ in range(count)]
+
+
+def _legacy_concat(frames):
+    """旧实现：逐表拼接，用作对照"""
+    merged_df = pd.DataFrame()
+    for df in frames:
+        if merged_df.empty:
+            merged_df = df
+        else:
+            merged_df = pd.concat([merged_df, df], ignore_index=True, sort=False)
+    return merged_df
+
+
+def _timed(func, frames):
+    start = time.perf_counter()
+    func(frames)
+    return time.perf_counter() - start
+
+
+def bench_concat(sheet_counts, rows, legacy=True, max_ratio=3.0):
+    """测量拼接耗时随工作表数量的变化，每表耗时增长超过 max_ratio 倍视为退化"""
+    results = []
+    for count in sheet_counts:
+        frames = _make_sheets(count, rows)
+        result = {'sheets': count, 'single_pass': _timed(concat_frames, frames)}
+        if legacy:
+            result['legacy'] = _timed(_legacy_concat, frames)
+        results.append(result)
+        print(f"{count:>6} 个工作表  单次拼接 {result['single_pass']:.3f}s"
+              + (f"  逐表拼接 {result['legacy']:.3f}s" if legacy else ''))
+
+    first, last = results[0], results[-1]
+    ratio = (last['single_pass'] / last['sheets']) / (first['single_pass'] / first['sheets'])
+    print(f"每个工作表耗时增长倍数: {ratio:.2f}（上限 {max_ratio}）")
+    return results, ratio <= max_ratio
+
+
+def random_spec(rng, pipe_ratio=0.15, flat_bar_ratio=0.2):
+    """生成一个规格字符串
+
+    扁钢按 FB/FBF/FBZ 的格式，钢管带 'Ф' 和长度，其余从 MATERIAL_TYPES 的前缀中随机选取，
+    另有少量非标底座和无法归类的规格。
+    """
+    roll = rng.random()
+    if roll < flat_bar_ratio:
+        width, thick, length = rng.choice([40, 50, 60]), rng.choice([4, 5, 6]), rng.randrange(500, 3000, 50)
+        kind = rng.choice(['FB', 'FBF', 'FBZ'])
+        if kind == 'FBF':
+            return f'FBF-{width}X{thick}-{length}-{rng.randrange(20, 60, 5)}'
+        return f'{kind}-{width}X{thick}-{length}'
+    if roll < flat_bar_ratio + pipe_ratio:
+        prefix = rng.choice(MATERIAL_TYPES['钢管'])
+        return f'{prefix}Ф{rng.choice([32, 48, 60, 89, 114])}-{rng.randrange(1000, 6000, 100)}'
+    if roll < 0.97:
+        material = rng.choice(['基座', '角钢'])
+        prefix = rng.choice(MATERIAL_TYPES[material]).rstrip('-')
+        return f'{prefix}-{rng.randrange(10, 200)}'
+    if roll < 0.99:
+        return f'非标底座-{rng.randrange(1, 20)}'
+    return f'XX-{rng.randrange(1, 100)}'
+
+
+def make_rows(rows, rng, y_ratio=0.6):
+    """生成一张输入工作表的数据，表面处理按 y_ratio 在 Y/G 间分配"""
+    treatments = list(SURFACE_TREATMENTS)
+    return pd.DataFrame({
+        '序号': range(1, rows + 1),
+        '规格': [random_spec(rng) for _ in range(rows)],
+        '数量': [rng.randint(1, 20) for _ in range(rows)],
+        '表面处理': [treatments[0] if rng.random() < y_ratio else rng.choice(treatments[1:])
+                 for _ in range(rows)],
+        '是否带腹板': [rng.choice(['是', '否']) for _ in range(rows)],
+        '备注': [''] * rows,
+    })
+
+
+def generate_workbooks(directory, files=10, sheets=3, rows=1000, y_ratio=0.6, seed=0):
+    """在 directory 下生成 files 个输入工作簿，返回文件路径列表"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f'bom_{index:04d}.xlsx')
+        write_sheets([(f'Sheet{n + 1}', make_rows(rows, rng, y_ratio)) for n in range(sheets)],
+                     path, streaming=True)
+        paths.append(path)
+    return paths
+
+
+def _make_merged_frame(rows, seed=0):
+    """生成一张与合并结果结构相同的明细表"""
+    return make_rows(rows, random.Random(seed))
+
+
+def _peak_rss_bytes():
+    """进程迄今为止的峰值内存，平台不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure_write(rows, streaming, queue):
+    sheets, _ = build_output_sheets(_make_merged_frame(rows))
+    rss_before = _peak_rss_bytes()
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        write_sheets(sheets, os.path.join(tmp, 'out.xlsx'), streaming=streaming)
+        elapsed = time.perf_counter() - start
+    rss_after = _peak_rss_bytes()
+    queue.put({'seconds': elapsed, 'peak_rss': rss_after,
+               'rss_growth': None if rss_after is None else rss_after - rss_before})
+
+
+def bench_write(row_counts):
+    """在独立子进程中分别测量普通写出和流式写出，避免两种模式的内存峰值互相影响"""
+    results = []
+    for rows in row_counts:
+        for streaming in (False, True):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_measure_write, args=(rows, streaming, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            result.update(rows=rows, mode='streaming' if streaming else 'openpyxl')
+            results.append(result)
+            memory = ''
+            if result['peak_rss'] is not None:
+                memory = (f"  峰值内存 {result['peak_rss'] / 1024 / 1024:.0f} MB"
+                          f"（写出阶段增长 {result['rss_growth'] / 1024 / 1024:.0f} MB）")
+            print(f"{rows:>8} 行  {result['mode']:<9}  {result['seconds']:.2f}s{memory}")
+    return results
+
+
+class StageTimer:
+    """逐阶段记录耗时、处理行数和 tracemalloc 内存峰值"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def run(self, name, rows, func, *args):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        self.add(name, rows, elapsed, peak)
+        return result
+
+    def add(self, name, rows, seconds, peak_bytes=None):
+        self.stages.append({
+            'stage': name,
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds) if seconds > 0 else None,
+            'peak_memory_bytes': peak_bytes,
+        })
+
+
+def _process_materials_timed(timer, totals):
+    """按材料分别计时各处理函数，同一材料的 Y/G 表合计"""
+    groups = dict(list(totals.groupby(['表面处理', '材料'], observed=True)))
+    for material in load_catalog().materials:
+        keys = [key for key in groups if key[1] == material]
+        if not keys:
+            continue
+        process = MATERIAL_PROCESSORS.get(material)
+        name = process.__name__ if process is not None else material
+        rows = sum(len(groups[key]) for key in keys)
+        timer.run(name, rows, lambda: [_process_material(groups[key], key[0], material, [])
+                                       for key in keys])
+
+
+def bench_pipeline(file_paths, workers=1, streaming=False, trace_memory=False):
+    """对完整合并流程分阶段计时，返回可序列化为 JSON 的结果"""
+    timer = StageTimer(trace_memory)
+    total_start = time.perf_counter()
+
+    frames = timer.run('read', 0, read_excel_files, file_paths, workers)
+    rows = sum(len(df) for df in frames)
+    timer.stages[-1].update(rows=rows, rows_per_second=round(rows / timer.stages[-1]['seconds']))
+
+    merged_df = timer.run('concat', rows, concat_frames, frames)
+    merged_df['数量'] = pd.to_numeric(merged_df['数量'], errors='coerce')
+
+    def classify():
+        _, treated, materials = split_surface_treatments(merged_df)
+        return aggregate_materials(treated, materials)
+    totals = timer.run('classify', rows, classify)
+    _process_materials_timed(timer, totals)
+
+    sheets, _ = build_output_sheets(merged_df)
+    with tempfile.TemporaryDirectory() as tmp:
+        timer.run('write', sum(len(df) for _, df in sheets), write_sheets, sheets,
+                  os.path.join(tmp, 'out.xlsx'), streaming)
+
+    return {
+        'files': len(file_paths),
+        'rows': rows,
+        'workers': workers,
+        'streaming': streaming,
+        'total_seconds': round(time.perf_counter() - total_start, 4),
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'stages': timer.stages,
+    }
+
+
+def _legacy_flat_bar_lengths(specs):
+    """旧实现：整列按 [-XP] 拆成宽表后按前缀赋值，用作对照"""
+    lengths = pd.Series(0.0, index=specs.index)
+    split_cols = specs.str.split(r'[-XP]', expand=True)
+    split_cols = split_cols.reindex(columns=range(max(5, split_cols.shape[1])))
+    a = split_cols[0].fillna('0')
+    c = pd.to_numeric(split_cols[2], errors='coerce').fillna(0)
+    d = pd.to_numeric(split_cols[3], errors='coerce').fillna(0)
+    e = pd.to_numeric(split_cols[4], errors='coerce').fillna(0)
+    lengths[a == 'FB'] = c + 2*d - 10
+    lengths[a == 'FBF'] = c + 2*e - 10
+    lengths[a == 'FBZ'] = c + 2*d + 250 - 15
+    return lengths
+
+
+def bench_specs(row_counts, legacy=True, seed=0):
+    """测量扁钢长度解析的吞吐量，返回 (结果, 新旧实现结果是否一致)"""
+    rng = random.Random(seed)
+    results = []
+    identical = True
+    for rows in row_counts:
+        specs = pd.Series([random_spec(rng, flat_bar_ratio=1.0) for _ in range(rows)])
+        start = time.perf_counter()
+        lengths = flat_bar_lengths(specs).fillna(0)
+        result = {'rows': rows, 'rules': time.perf_counter() - start}
+        if legacy:
+            start = time.perf_counter()
+            expected = _legacy_flat_bar_lengths(specs)
+            result['legacy'] = time.perf_counter() - start
+            same = lengths.equals(expected)
+            identical = identical and same
+        results.append(result)
+        print(f"{rows:>9} 个规格（{specs.nunique()} 种）  规则 {result['rules']:.3f}s "
+              f"({rows / result['rules']:.0f} 个/秒)"
+              + (f"  旧实现 {result['legacy']:.3f}s ({rows / result['legacy']:.0f} 个/秒)"
+                 f"  {'一致' if same else '不一致'}" if legacy else ''))
+    return results, identical
+
+
+def _frames_differ(expected, actual):
+    """两个 DataFrame 不同时返回说明，相同时返回 None"""
+    try:
+        pd.testing.assert_frame_equal(expected, actual)
+    except AssertionError as e:
+        return str(e).strip().splitlines()[0]
+    return None
+
+
+def bench_readers(file_paths, readers=None, workers=1):
+    """用各读取后端读取并合并同一批文件，返回 (结果, 是否全部一致)
+
+    第一个后端的结果作为基准，其余后端的每张输出工作表（包括合并明细 '总'）都与之比较。
+    """
+    if readers is None:
+        readers = ['default', 'calamine'] if HAS_CALAMINE else ['default']
+    results = []
+    expected = None
+    identical = True
+    for reader in readers:
+        start = time.perf_counter()
+        frames = read_excel_files(file_paths, workers, reader=reader)
+        seconds = time.perf_counter() - start
+        merged_df, _ = merge_frames(frames)
+        sheets, _ = build_output_sheets(merged_df)
+
+        differences = []
+        if expected is None:
+            expected = dict(sheets)
+        else:
+            if [name for name, _ in sheets] != list(expected):
+                differences.append('输出工作表不同')
+            for name, df in sheets:
+                if name in expected:
+                    difference = _frames_differ(expected[name], df)
+                    if difference is not None:
+                        differences.append(f'{name}：{difference}')
+        identical = identical and not differences
+        results.append({
+            'reader': reader,
+            'read_seconds': round(seconds, 4),
+            'rows': len(merged_df),
+            'rows_per_second': round(len(merged_df) / seconds) if seconds > 0 else None,
+            'differences': differences,
+        })
+    return results, identical
+
+
+def _dataset_paths(args, tmp):
+    """--input 指定的目录中的工作簿，未指定时在 tmp 中生成"""
+    if args.input:
+        return sorted(os.path.join(args.input, f) for f in os.listdir(args.input)
+                      if f.endswith(('.xlsx', '.xls')))
+    return generate_workbooks(tmp, args.files, args.sheets, args.rows, args.y_ratio, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='merge_excel 性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    concat_parser = subparsers.add_parser('concat', help='工作表拼接的线性扩展回归测试')
+    concat_parser.add_argument('--sheets', type=int, nargs='+',
+                               default=[250, 500, 1000, 2000, 4000])
+    concat_parser.add_argument('--rows', type=int, default=50)
+    concat_parser.add_argument('--no-legacy', action='store_true',
+                               help='不运行旧的逐表拼接对照')
+    concat_parser.add_argument('--max-ratio', type=float, default=3.0)
+
+    write_parser = subparsers.add_parser('write', help='普通写出与流式写出的耗时和内存对比')
+    write_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 200000])
+
+    def add_dataset_arguments(sub):
+        sub.add_argument('--files', type=int, default=10)
+        sub.add_argument('--sheets', type=int, default=3, help='每个文件的工作表数')
+        sub.add_argument('--rows', type=int, default=1000, help='每张工作表的行数')
+        sub.add_argument('--y-ratio', type=float, default=0.6, help='表面处理为 Y 的比例')
+        sub.add_argument('--seed', type=int, default=0)
+
+    generate_parser = subparsers.add_parser('generate', help='生成合成的输入工作簿')
+    generate_parser.add_argument('directory')
+    add_dataset_arguments(generate_parser)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help='分阶段测量完整合并流程')
+    add_dataset_arguments(pipeline_parser)
+    pipeline_parser.add_argument('--input', help='已生成的输入目录，不指定时临时生成')
+    pipeline_parser.add_argument('-j', '--workers', type=int, default=1)
+    pipeline_parser.add_argument('--streaming', action='store_true')
+    pipeline_parser.add_argument('--trace-memory', action='store_true',
+                                 help='用 tracemalloc 统计各阶段内存峰值，计时会明显变慢')
+    pipeline_parser.add_argument('--output', help='JSON 结果写入的文件，默认输出到标准输出')
+
+    readers_parser = subparsers.add_parser('readers', help='各读取后端的耗时对比和结果一致性检查')
+    add_dataset_arguments(readers_parser)
+    readers_parser.add_argument('--input', help='已生成的输入目录，不指定时临时生成')
+    readers_parser.add_argument('-j', '--workers', type=int, default=1)
+    readers_parser.add_argument('--readers', nargs='+', choices=['default', 'calamine'],
+                                help='要比较的后端，默认比较所有可用后端，第一个作为基准')
+
+    specs_parser = subparsers.add_parser('specs', help='扁钢长度解析的吞吐量')
+    specs_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    specs_parser.add_argument('--no-legacy', action='store_true',
+                              help='不运行旧的整列拆分对照')
+    specs_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == 'concat':
+        _, linear = bench_concat(args.sheets, args.rows,
+                                 legacy=not args.no_legacy, max_ratio=args.max_ratio)
+        return 0 if linear else 1
+    if args.command == 'write':
+        bench_write(args.rows)
+        return 0
+    if args.command == 'specs':
+        _, identical = bench_specs(args.rows, legacy=not args.no_legacy, seed=args.seed)
+        return 0 if identical else 1
+    if args.command == 'generate':
+        paths = generate_workbooks(args.directory, args.files, args.sheets, args.rows,
+                                   args.y_ratio, args.seed)
+        print(f"已生成 {len(paths)} 个工作簿到 {args.directory}")
+        return 0
+    if args.command == 'readers':
+        with tempfile.TemporaryDirectory() as tmp:
+            results, identical = bench_readers(_dataset_paths(args, tmp), args.readers,
+                                               args.workers)
+        for result in results:
+            print(f"{result['reader']:<10}{result['read_seconds']:>8.2f}s  "
+                  f"{result['rows']} 行  {result['rows_per_second']} 行/秒")
+            for difference in result['differences']:
+                print(f"  不一致  {difference}")
+        print('各后端结果一致' if identical else '各后端结果不一致')
+        return 0 if identical else 1
+    if args.command == 'pipeline':
+        with tempfile.TemporaryDirectory() as tmp:
+            result = bench_pipeline(_dataset_paths(args, tmp), args.workers, args.streaming,
+                                    args.trace_memory)
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            print(text)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
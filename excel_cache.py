@@ -0,0 +1,113 @@
+"""已解析工作簿的磁盘缓存
+
+每个输入工作簿解析后的 [(工作表名, DataFrame), ...] 以 pickle 保存为一个缓存文件，
+键由文件路径、大小、修改时间（可选内容哈希）和读取选项计算得到。
+缓存目录总大小超过上限时按最近使用时间淘汰最旧的条目。
+"""
+import hashlib
+import os
+import pickle
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SUFFIX = '.pkl'
+# 缓存内容的格式，解析结果中记录的信息变化时递增，旧的缓存条目不再命中
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    """Windows 下放在 %LOCALAPPDATA%，其他系统放在 ~/.cache"""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'excel_merger', 'cache')
+
+
+def _content_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """按文件指纹缓存解析结果
+
+    use_content_hash 为 True 时键中加入文件内容哈希，文件被复制或仅修改时间变化也能命中，
+    代价是每次都要完整读取一遍文件。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, use_content_hash=False):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.use_content_hash = use_content_hash
+
+    def _entry_path(self, file_path, options):
+        stat = os.stat(file_path)
+        parts = [os.path.normcase(os.path.abspath(file_path)), stat.st_size, stat.st_mtime_ns,
+                 repr(options), CACHE_FORMAT]
+        if self.use_content_hash:
+            parts = [_content_hash(file_path), repr(options), CACHE_FORMAT]
+        key = hashlib.sha1('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, file_path, options=()):
+        """命中时返回缓存的工作表列表，否则返回 None"""
+        entry = self._entry_path(file_path, options)
+        try:
+            with open(entry, 'rb') as f:
+                sheets = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 缓存文件损坏或版本不兼容时丢弃，回退到重新解析
+            self._remove(entry)
+            return None
+        # 更新修改时间，作为 LRU 淘汰依据
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return sheets
+
+    def put(self, file_path, sheets, options=()):
+        entry = self._entry_path(file_path, options)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{entry}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(sheets, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry)
+        except OSError:
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """删除最久未使用的条目，直到总大小不超过 max_bytes（默认取缓存上限）"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for item in it:
+                    if item.is_file() and item.name.endswith(CACHE_SUFFIX):
+                        stat = item.stat()
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+        except FileNotFoundError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        self.evict(max_bytes=0)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
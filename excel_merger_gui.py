@@ -1,18 +1,69 @@
 import sys
 import os
+import time
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLabel, QFileDialog,
                             QListWidget, QLineEdit, QMessageBox, QProgressBar,
-                            QFrame)
-from PyQt5.QtCore import Qt, QTimer
+                            QFrame, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
-from merge_excel import merge_excel_files
+
+# measure_startup.py 通过该环境变量传入文件路径，窗口显示后写入时间戳并退出
+STARTUP_PROBE_ENV = 'EXCEL_MERGER_STARTUP_PROBE'
+
+# 各阶段在进度条上占的区间 (起点, 终点)
+PROGRESS_RANGES = {
+    'read': (0, 80),
+    'process': (80, 85),
+    'write': (85, 100),
+}
+
+class MergeWorker(QObject):
+    """在后台线程中执行合并，通过信号把进度和结果送回界面线程"""
+    progress = pyqtSignal(str, int, int, int)
+    finished = pyqtSignal(object, str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, file_paths, output_file, incremental=False):
+        super().__init__()
+        self.file_paths = file_paths
+        self.output_file = output_file
+        self.incremental = incremental
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        # 合并引擎依赖 pandas，首次合并时才导入，缩短窗口出现前的启动时间
+        from merge_excel import merge_excel_files, MergeCancelled
+        from merge_metrics import MergeMetrics
+        
+        metrics = MergeMetrics()
+        try:
+            summary = merge_excel_files(self.file_paths, self.output_file, workers=None,
+                                        progress=self.progress.emit,
+                                        cancel=self.cancel_event,
+                                        metrics=metrics,
+                                        incremental=self.incremental,
+                                        diff=True)
+        except MergeCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(summary, metrics.summary())
+
+    def cancel(self):
+        self.cancel_event.set()
 
 class ExcelMergerApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.initUI()
         self.output_file_path = None
+        self.merge_thread = None
+        self.merge_worker = None
         
     def initUI(self):
         self.setWindowTitle('Excel 合并工具')
@@ -110,6 +161,15 @@ class ExcelMergerApp(QMainWindow):
         file_name_layout.addWidget(self.open_button)
         layout.addLayout(file_name_layout)
         
+        # 增量合并：只处理上次合并后有变化的文件
+        self.incremental_check = QCheckBox("增量合并（只处理新增或修改过的文件）")
+        layout.addWidget(self.incremental_check)
+        
+        # 当前使用的材料目录，悬停显示各材料的前缀
+        self.catalog_label = QLabel()
+        layout.addWidget(self.catalog_label)
+        self.refresh_catalog()
+        
         # 进度条
         self.progress = QProgressBar()
         self.progress.setVisible(False)
@@ -128,6 +188,7 @@ class ExcelMergerApp(QMainWindow):
         
         # 合并按钮
         merge_button = QPushButton("合并文件")
+        self.merge_button = merge_button
         merge_button.setStyleSheet("""
             QPushButton {
                 background-color: #34C759;
@@ -159,6 +220,23 @@ class ExcelMergerApp(QMainWindow):
         clear_button.clicked.connect(self.clear_list)
         button_layout.addWidget(clear_button)
         
+        # 取消按钮，仅在合并进行中可用
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #8E8E93;
+                color: white;
+                font-size: 14px;
+                padding: 8px 16px;
+            }
+            QPushButton:hover {
+                background-color: #636366;
+            }
+        """)
+        self.cancel_button.clicked.connect(self.cancel_merge)
+        button_layout.addWidget(self.cancel_button)
+        
         button_frame.setLayout(button_layout)
         layout.addWidget(button_frame)
         
@@ -177,6 +255,25 @@ class ExcelMergerApp(QMainWindow):
             else:
                 self.open_button.setEnabled(False)
                 
+    def refresh_catalog(self):
+        """重新加载材料目录并更新提示，目录有错误时返回 None"""
+        from material_catalog import CatalogError, load_catalog
+        
+        try:
+            catalog = load_catalog()
+        except CatalogError as e:
+            self.catalog_label.setText(f"材料目录有错误：{e}")
+            self.catalog_label.setToolTip(str(e))
+            return None
+        source = os.path.basename(catalog.source) if catalog.source else "内置"
+        text = (f"材料目录：{source}，{len(catalog.materials)} 种材料，"
+                f"{len(catalog.prefix_materials)} 个前缀")
+        if catalog.overlaps:
+            text += f"，{len(catalog.overlaps)} 处前缀重叠"
+        self.catalog_label.setText(text)
+        self.catalog_label.setToolTip(catalog.describe())
+        return catalog
+        
     def open_output_file(self):
         """打开生成的Excel文件"""
         if self.output_file_path and os.path.exists(self.output_file_path):
@@ -209,8 +306,9 @@ class ExcelMergerApp(QMainWindow):
         self.output_file_path = os.path.join(self.output_path.text(), 
                                  f"{self.file_name.text()}.xlsx")
         
-        # 检查输出文件是否已存在
-        if os.path.exists(self.output_file_path):
+        # 检查输出文件是否已存在，增量合并本来就是更新已有结果，不再询问
+        incremental = self.incremental_check.isChecked()
+        if os.path.exists(self.output_file_path) and not incremental:
             reply = QMessageBox.question(self, '文件已存在',
                                        '输出文件已存在，是否覆盖？',
                                        QMessageBox.Yes | QMessageBox.No,
@@ -218,46 +316,115 @@ class ExcelMergerApp(QMainWindow):
             if reply == QMessageBox.No:
                 return
         
+        # 每次合并前重新加载，目录文件修改后不必重启程序
+        if self.refresh_catalog() is None:
+            QMessageBox.warning(self, "错误", self.catalog_label.toolTip())
+            return
+        
         # 初始化进度条
         self.progress.setValue(0)
+        self.progress.setFormat("%p%")
         self.progress.setVisible(True)
         self.status_label.setText("正在合并文件...")
+        self.merge_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.open_button.setEnabled(False)
         
-        # 使用定时器模拟异步操作
-        QTimer.singleShot(100, lambda: self.do_merge(file_paths, self.output_file_path))
-            
-    def do_merge(self, file_paths, output_file):
-        try:
-            # 执行合并
-            merge_excel_files(file_paths, output_file)
-            
-            # 更新进度
-            self.progress.setValue(100)
-            self.status_label.setText("合并完成")
-            
-            # 显示成功消息并启用打开按钮
-            QMessageBox.information(self, "成功", 
-                                  f"文件已成功合并到：\n{output_file}")
-            self.open_button.setEnabled(True)
+        # 在后台线程中合并，界面保持响应
+        self.merge_started = time.perf_counter()
+        self.rows_read = 0
+        self.merge_thread = QThread(self)
+        self.merge_worker = MergeWorker(file_paths, self.output_file_path, incremental)
+        self.merge_worker.moveToThread(self.merge_thread)
+        self.merge_thread.started.connect(self.merge_worker.run)
+        self.merge_worker.progress.connect(self.on_merge_progress)
+        self.merge_worker.finished.connect(self.on_merge_finished)
+        self.merge_worker.failed.connect(self.on_merge_failed)
+        self.merge_worker.cancelled.connect(self.on_merge_cancelled)
+        for signal in (self.merge_worker.finished, self.merge_worker.failed,
+                       self.merge_worker.cancelled):
+            signal.connect(self.merge_thread.quit)
+        self.merge_thread.finished.connect(self.on_thread_finished)
+        self.merge_thread.start()
+        
+    def cancel_merge(self):
+        if self.merge_worker is not None:
+            self.merge_worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.status_label.setText("正在取消...")
             
-        except Exception as e:
-            # 删除可能创建的部分文件
-            if os.path.exists(output_file):
-                try:
-                    os.remove(output_file)
-                except:
-                    pass
-                    
-            # 显示错误信息
-            self.progress.setValue(0)
-            self.status_label.setText("合并失败")
-            QMessageBox.critical(self, "错误", 
-                               f"合并过程中发生错误：\n{str(e)}")
-            self.open_button.setEnabled(False)
+    def on_merge_progress(self, stage, done, total, rows):
+        """根据合并进度更新进度条和吞吐量"""
+        start, end = PROGRESS_RANGES[stage]
+        if total:
+            self.progress.setValue(int(start + (end - start) * done / total))
+        elapsed = max(time.perf_counter() - self.merge_started, 1e-6)
+        
+        if stage == 'read':
+            self.rows_read += rows
+            self.progress.setFormat(f"%p%  读取 {done}/{total} 个文件")
+            self.status_label.setText(
+                f"已读取 {done}/{total} 个文件，{self.rows_read} 行，"
+                f"{self.rows_read / elapsed:.0f} 行/秒")
+        elif stage == 'process':
+            self.progress.setFormat("%p%  汇总中")
+            self.status_label.setText(f"正在汇总 {rows} 行数据...")
+        else:
+            self.progress.setFormat(f"%p%  写出 {done}/{total} 张工作表")
+            self.status_label.setText(f"已写出 {done}/{total} 张工作表，用时 {elapsed:.1f} 秒")
             
-        finally:
-            # 重置进度条
-            QTimer.singleShot(2000, lambda: self.progress.setVisible(False))
+    def on_merge_finished(self, summary, metrics_text):
+        elapsed = time.perf_counter() - self.merge_started
+        self.progress.setValue(100)
+        self.status_label.setText(
+            f"合并完成：{summary['rows']} 行，用时 {elapsed:.1f} 秒，"
+            f"{summary['rows'] / max(elapsed, 1e-6):.0f} 行/秒")
+        
+        # 显示成功消息并启用打开按钮，与上次结果的对比和耗时统计放在详细信息中
+        from merge_diff import format_report
+        
+        report = summary.get('diff')
+        if report is None:
+            diff_text = "首次合并到该文件，已保存汇总快照，下次合并后显示变化"
+        else:
+            diff_text = format_report(report)
+        message = QMessageBox(QMessageBox.Information, "成功",
+                              f"文件已成功合并到：\n{self.output_file_path}",
+                              QMessageBox.Ok, self)
+        message.setInformativeText(diff_text.split('\n')[0])
+        message.setDetailedText(f"{diff_text}\n\n{metrics_text}")
+        message.exec_()
+        self.open_button.setEnabled(True)
+        
+    def on_merge_failed(self, message):
+        # 显示错误信息。输出先写到临时文件，失败时原有的输出文件保持不变，不需要清理
+        self.progress.setValue(0)
+        self.status_label.setText("合并失败")
+        QMessageBox.critical(self, "错误", 
+                           f"合并过程中发生错误：\n{message}")
+        self.open_button.setEnabled(False)
+        
+    def on_merge_cancelled(self):
+        self.progress.setValue(0)
+        self.status_label.setText("合并已取消")
+        self.open_button.setEnabled(False)
+        
+    def on_thread_finished(self):
+        self.merge_worker.deleteLater()
+        self.merge_thread.deleteLater()
+        self.merge_worker = None
+        self.merge_thread = None
+        self.merge_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        # 重置进度条
+        QTimer.singleShot(2000, lambda: self.progress.setVisible(False))
+        
+    def closeEvent(self, event):
+        """关闭窗口时取消正在进行的合并并等待后台线程退出"""
+        if self.merge_thread is not None:
+            self.merge_worker.cancel()
+            self.merge_thread.wait()
+        super().closeEvent(event)
             
     def clear_list(self):
         self.file_list.clear()
@@ -289,7 +456,18 @@ class ExcelMergerApp(QMainWindow):
                     QMessageBox.warning(self, "错误", f"文件格式不支持: {file_path}")
 
 if __name__ == '__main__':
+    # 打包后的 exe 中使用进程池并行读取需要此调用
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = ExcelMergerApp()
     window.show()
+    
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if probe_path:
+        def record_startup():
+            with open(probe_path, 'w') as f:
+                f.write(repr(time.time()))
+            app.quit()
+        QTimer.singleShot(0, record_startup)
+        
     sys.exit(app.exec_())
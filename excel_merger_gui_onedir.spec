@@ -0,0 +1,66 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 启动优化的构建配置：onedir 免去每次启动解包，排除用不到的 pandas/Qt 子模块，不使用 UPX 压缩。
+# 用法：pyinstaller excel_merger_gui_onedir.spec，启动时间用 measure_startup.py 测量。
+
+excludes = [
+    # 测试、交互和绘图相关，运行时不会用到
+    'tkinter', 'pytest', 'IPython', 'jupyter',
+    'matplotlib', 'scipy', 'numexpr', 'bottleneck', 'numba', 'sqlalchemy',
+    'pandas.tests', 'numpy.tests', 'numpy.f2py', 'numpy.distutils',
+    # pandas 的可选依赖，合并流程不使用（pyarrow 用于导出 Parquet/Feather，需保留）
+    'fastparquet', 'tables', 'lxml', 'html5lib', 'bs4',
+    'jinja2', 'xlsxwriter', 'odf', 'pyxlsb', 's3fs', 'fsspec', 'gcsfs',
+    # 只用到 QtCore/QtGui/QtWidgets
+    'PyQt5.QtWebEngine', 'PyQt5.QtWebEngineCore', 'PyQt5.QtWebEngineWidgets',
+    'PyQt5.QtNetwork', 'PyQt5.QtQml', 'PyQt5.QtQuick', 'PyQt5.QtQuickWidgets',
+    'PyQt5.QtSql', 'PyQt5.QtMultimedia', 'PyQt5.QtMultimediaWidgets',
+    'PyQt5.QtBluetooth', 'PyQt5.QtDesigner', 'PyQt5.QtOpenGL', 'PyQt5.QtSvg',
+    'PyQt5.QtTest', 'PyQt5.QtXml', 'PyQt5.QtXmlPatterns', 'PyQt5.QtPositioning',
+    'PyQt5.QtLocation', 'PyQt5.QtSensors', 'PyQt5.QtSerialPort', 'PyQt5.QtWebSockets',
+    'PyQt5.QtWebChannel', 'PyQt5.QtNfc', 'PyQt5.QtPrintSupport', 'PyQt5.QtHelp',
+]
+
+a = Analysis(
+    ['excel_merger_gui.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    # pandas 在读取时才按名称导入 calamine 引擎，PyInstaller 分析不到
+    hiddenimports=['python_calamine'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=excludes,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='excel_merger_gui',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['WPS-EXECL.ico'],
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='excel_merger_gui',
+)
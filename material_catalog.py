@@ -0,0 +1,203 @@
+"""材料目录：规格前缀与材料类型的对应关系
+
+默认使用 material_types.MATERIAL_TYPES。程序所在目录（打包后为 exe 所在目录）下有
+materials.json 时改用其中的内容，安装了 PyYAML 时也可以是 materials.yaml / materials.yml；
+环境变量 EXCEL_MERGER_MATERIALS 可以指定其他路径。文件格式与 MATERIAL_TYPES 相同：
+{材料: [前缀, ...]}，材料的先后顺序就是输出汇总表的顺序。
+
+加载时把全部前缀编译成索引：单个规格按前缀长度从长到短各查一次字典，耗时只与规格长度有关；
+整列分类时先对规格去重，再用最长前缀优先的正则扫描一遍。同一前缀出现在两种材料下视为错误；一种材料的前缀是
+另一种材料前缀的开头（如基座的 'B' 与钢管的 'BG-外径'）时按最长前缀归类，并在 overlaps 中
+列出以便检查。加载结果按文件路径、大小和修改时间缓存，文件不变时不会重复解析。
+
+用法：
+    python material_catalog.py                  查看当前使用的目录和前缀重叠情况
+    python material_catalog.py --check 文件     检查目录文件
+    python material_catalog.py --dump 文件      把内置目录写成 JSON，作为编辑的起点
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from material_types import MATERIAL_TYPES
+
+CATALOG_FILE_NAMES = ('materials.json', 'materials.yaml', 'materials.yml')
+CATALOG_PATH_ENV = 'EXCEL_MERGER_MATERIALS'
+
+
+class CatalogError(ValueError):
+    """材料目录格式错误或前缀有歧义"""
+
+
+def _validate(types, source):
+    where = f"材料目录 {source}" if source else "材料目录"
+    if not isinstance(types, dict) or not types:
+        raise CatalogError(f"{where} 应为 {{材料: [前缀, ...]}} 格式且不能为空")
+    result = {}
+    for material, prefixes in types.items():
+        if not isinstance(material, str) or not material:
+            raise CatalogError(f"{where} 中的材料名必须是非空文本：{material!r}")
+        if not isinstance(prefixes, list):
+            raise CatalogError(f"{where} 中 '{material}' 的前缀应为列表")
+        for prefix in prefixes:
+            if not isinstance(prefix, str) or not prefix:
+                raise CatalogError(f"{where} 中 '{material}' 的前缀必须是非空文本：{prefix!r}")
+        # 同一材料内重复的前缀只保留一个
+        result[material] = list(dict.fromkeys(prefixes))
+    return result
+
+
+def find_overlaps(prefix_materials):
+    """不同材料之间一个前缀是另一个前缀开头的情况，返回 [(短前缀, 材料, 长前缀, 材料), ...]"""
+    overlaps = []
+    for short, short_material in prefix_materials.items():
+        for long, long_material in prefix_materials.items():
+            if long != short and long.startswith(short) and long_material != short_material:
+                overlaps.append((short, short_material, long, long_material))
+    return overlaps
+
+
+class MaterialCatalog:
+    """编译后的材料目录，materials 为材料顺序，prefix_materials 为 {前缀: 材料}"""
+
+    def __init__(self, types, source=None):
+        self.source = source
+        self.types = _validate(types, source)
+        self.materials = list(self.types)
+        self.prefix_materials = {}
+        for material, prefixes in self.types.items():
+            for prefix in prefixes:
+                owner = self.prefix_materials.setdefault(prefix, material)
+                if owner != material:
+                    raise CatalogError(f"前缀 '{prefix}' 同时属于 '{owner}' 和 '{material}'")
+        self.lengths = sorted({len(prefix) for prefix in self.prefix_materials}, reverse=True)
+        alternatives = sorted(self.prefix_materials, key=len, reverse=True)
+        self.pattern = re.compile('^(' + '|'.join(map(re.escape, alternatives)) + ')')
+        self.overlaps = find_overlaps(self.prefix_materials)
+
+    def match(self, spec):
+        """规格匹配的最长前缀，没有匹配或规格不是文本时返回 None"""
+        if not isinstance(spec, str):
+            return None
+        for length in self.lengths:
+            if length <= len(spec) and spec[:length] in self.prefix_materials:
+                return spec[:length]
+        return None
+
+    def classify(self, spec):
+        """规格的材料类型，没有匹配的前缀时返回 None"""
+        prefix = self.match(spec)
+        return None if prefix is None else self.prefix_materials[prefix]
+
+    def classify_series(self, specs):
+        """为一列规格确定材料类型，返回类别顺序与 materials 相同的 category，未匹配的为 NaN
+
+        BOM 中同一规格通常重复出现很多次，先去重，每个不同的规格只匹配一次。
+        """
+        import pandas as pd
+
+        codes, uniques = pd.factorize(specs)
+        prefixes = pd.Series(uniques, dtype=object).str.extract(self.pattern, expand=False)
+        materials = pd.Categorical(prefixes.map(self.prefix_materials), categories=self.materials)
+        return materials.take(codes, allow_fill=True)
+
+    def describe(self):
+        """来源、材料和前缀数量以及前缀重叠情况的多行文本"""
+        lines = [f"材料目录：{self.source or '内置（material_types.py）'}",
+                 f"{len(self.materials)} 种材料，{len(self.prefix_materials)} 个前缀"]
+        for material, prefixes in self.types.items():
+            lines.append(f"  {material}：{'、'.join(prefixes)}")
+        if self.overlaps:
+            lines.append("前缀重叠（按最长前缀归类）：")
+            for short, short_material, long, long_material in self.overlaps:
+                lines.append(f"  {short}（{short_material}）是 {long}（{long_material}）的开头")
+        return '\n'.join(lines)
+
+
+def catalog_dir():
+    """查找目录文件的位置：打包后为 exe 所在目录，否则为本模块所在目录"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def find_catalog_file(directory=None):
+    """环境变量指定的文件，或 directory（默认 catalog_dir()）下的目录文件，都没有时返回 None"""
+    path = os.environ.get(CATALOG_PATH_ENV)
+    if path:
+        return path
+    directory = catalog_dir() if directory is None else directory
+    for name in CATALOG_FILE_NAMES:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_catalog_file(path):
+    try:
+        with open(path, encoding='utf-8-sig') as f:
+            if path.lower().endswith('.json'):
+                return json.load(f)
+            try:
+                import yaml
+            except ImportError:
+                raise CatalogError("读取 YAML 格式的材料目录需要安装 PyYAML") from None
+            return yaml.safe_load(f)
+    except CatalogError:
+        raise
+    except Exception as e:
+        raise CatalogError(f"无法读取材料目录 {path}：{e}") from e
+
+
+_loaded = {}
+
+
+def load_catalog(path=None):
+    """加载并编译材料目录
+
+    path 为 None 时使用 find_catalog_file() 找到的文件，没有时使用内置的 MATERIAL_TYPES。
+    文件格式错误或前缀有歧义时抛出 CatalogError。
+    """
+    if path is None:
+        path = find_catalog_file()
+    key = None
+    if path is not None:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            raise CatalogError(f"无法读取材料目录 {path}：{e}") from e
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _loaded:
+        types = MATERIAL_TYPES if path is None else read_catalog_file(path)
+        catalog = MaterialCatalog(types, path)
+        # 只保留最近一次的结果，目录文件修改后旧的编译结果不再需要
+        _loaded.clear()
+        _loaded[key] = catalog
+    return _loaded[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查看、检查或导出材料目录')
+    parser.add_argument('--check', metavar='文件', help='检查指定的目录文件')
+    parser.add_argument('--dump', metavar='文件', help='把内置目录写成 JSON 文件')
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        with open(args.dump, 'w', encoding='utf-8') as f:
+            json.dump(MATERIAL_TYPES, f, ensure_ascii=False, indent=2)
+        print(f"已写出内置材料目录到 {args.dump}")
+        return 0
+    try:
+        catalog = load_catalog(args.check)
+    except CatalogError as e:
+        print(e)
+        return 1
+    print(catalog.describe())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
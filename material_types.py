@@ -5,3 +5,18 @@ MATERIAL_TYPES = {
     '角钢': ['LDK', 'L50','L40','YXJ1','J'],
     '钢管': ['外径','圆形，外径','BG-外径']
 }
+
+# 表面处理代码及其汇总表名称，输出 '{名称}{代码}总' 和 '{材料}{代码}' 表
+SURFACE_TREATMENTS = {
+    'Y': '刷漆',
+    'G': '镀锌',
+}
+
+# 扁钢长度规则：规格按 '-'、'X'、'P' 拆成若干段，第 0 段为前缀，之后各段依次为第 1、2、3… 段
+# {前缀: ({段号: 系数}, 常数)}，长度 = Σ 段的数值 × 系数 + 常数，缺少或不是数字的段按 0 计
+# 新增扁钢类型只需在这里加一条规则；未列出的前缀长度记为 0
+FLAT_BAR_LENGTH_RULES = {
+    'FB': ({2: 1, 3: 2}, -10),
+    'FBF': ({2: 1, 4: 2}, -10),
+    'FBZ': ({2: 1, 3: 2}, 250 - 15),
+}
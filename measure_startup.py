@@ -0,0 +1,68 @@
+"""测量 GUI 从启动到窗口显示的时间
+
+用法：
+    python measure_startup.py                          # 测量 python excel_merger_gui.py
+    python measure_startup.py dist\\excel_merger_gui.exe --runs 5 --label v1.2 --history startup_history.csv
+
+程序通过环境变量 EXCEL_MERGER_STARTUP_PROBE 告诉 GUI 一个临时文件路径，
+GUI 显示窗口后写入当前时间并退出。结果以 JSON 输出，指定 --history 时追加一行 CSV，
+便于跨版本对比。
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 与 excel_merger_gui.STARTUP_PROBE_ENV 一致；不直接导入，避免测量脚本依赖 PyQt5
+STARTUP_PROBE_ENV = 'EXCEL_MERGER_STARTUP_PROBE'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_once(command, timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        probe_path = os.path.join(tmp, 'startup.txt')
+        env = dict(os.environ, **{STARTUP_PROBE_ENV: probe_path})
+        start = time.time()
+        subprocess.run(command, env=env, timeout=timeout, check=True)
+        with open(probe_path) as f:
+            return float(f.read()) - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测量 GUI 启动到窗口显示的时间')
+    parser.add_argument('exe', nargs='?', help='打包后的可执行文件，默认用当前 Python 运行源码')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--label', default='', help='记录到历史中的版本标识')
+    parser.add_argument('--history', help='追加结果的 CSV 文件')
+    args = parser.parse_args(argv)
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(HERE, 'excel_merger_gui.py')]
+    # 第一次运行包含磁盘冷缓存和 onefile 解包，单独报告
+    timings = [measure_once(command, args.timeout) for _ in range(args.runs)]
+    result = {
+        'label': args.label,
+        'command': ' '.join(command),
+        'runs': args.runs,
+        'first_seconds': round(timings[0], 3),
+        'median_seconds': round(statistics.median(timings), 3),
+        'min_seconds': round(min(timings), 3),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+    if args.history:
+        new_file = not os.path.exists(args.history)
+        with open(args.history, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(result))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(result)
+
+
+if __name__ == '__main__':
+    main()
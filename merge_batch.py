@@ -0,0 +1,148 @@
+"""批量合并多个项目目录
+
+每个包含 Excel 文件的目录是一个项目，合并为一个输出文件。多个项目用进程池并行处理，
+同时运行的项目数受 max_jobs 限制，单个项目失败不影响其他项目。
+"""
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from merge_excel import merge_excel_files
+from merge_watch import EXCEL_EXTENSIONS, list_excel_files
+
+DEFAULT_OUTPUT_TEMPLATE = os.path.join('{dir}', 'text.xlsx')
+
+
+def output_path_for(directory, template=DEFAULT_OUTPUT_TEMPLATE):
+    """按模板生成输出路径，可用 {dir}（项目目录）、{name}（目录名）、{date}（YYYYMMDD）"""
+    directory = os.path.abspath(directory)
+    return os.path.abspath(template.format(dir=directory, name=os.path.basename(directory),
+                                           date=time.strftime('%Y%m%d')))
+
+
+def _project_dirs(inputs, recursive):
+    """把输入的目录、文件和通配符展开为 {目录: 指定的文件列表或 None}
+
+    None 表示取目录下的全部 Excel 文件，同一目录既指定了文件又指定了目录本身时也取全部文件。
+    """
+    projects = {}
+    for pattern in inputs:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in sorted(matches):
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                if recursive:
+                    for root, dirs, _ in os.walk(path):
+                        dirs.sort()
+                        projects[root] = None
+                else:
+                    projects[path] = None
+            elif path.lower().endswith(EXCEL_EXTENSIONS):
+                files = projects.setdefault(os.path.dirname(path), [])
+                if files is not None:
+                    files.append(path)
+    return projects
+
+
+def discover_jobs(inputs, output_template=DEFAULT_OUTPUT_TEMPLATE, recursive=False):
+    """返回 [{'name', 'directory', 'files', 'output'}, ...]，没有 Excel 文件的目录会被跳过
+
+    各项目的输出文件不会被当作输入。多个项目的输出路径相同时抛出 ValueError，
+    此时输出模板需要包含 {dir} 或 {name}。
+    """
+    jobs = []
+    for directory, files in _project_dirs(inputs, recursive).items():
+        output = output_path_for(directory, output_template)
+        if files is None:
+            files = list_excel_files(directory, exclude=[output])
+        else:
+            files = [path for path in files
+                     if os.path.normcase(path) != os.path.normcase(output)]
+        if files:
+            try:
+                name = os.path.relpath(directory)
+            except ValueError:
+                # Windows 下与当前目录不在同一个盘
+                name = directory
+            jobs.append({'name': name, 'directory': directory, 'files': files, 'output': output})
+
+    owners = {}
+    for job in jobs:
+        owner = owners.setdefault(os.path.normcase(job['output']), job)
+        if owner is not job:
+            raise ValueError(f"项目 {owner['name']} 和 {job['name']} 的输出文件相同："
+                             f"{job['output']}，输出模板中请使用 {{dir}} 或 {{name}}")
+    return jobs
+
+
+def run_job(job, **merge_options):
+    """合并一个项目，异常不向外抛出，记录在结果的 'error' 中
+
+    merge_options 中 diff 为 True 且有上次的快照时，'changes' 为有变化的规格数。
+    """
+    start = time.perf_counter()
+    result = {'name': job['name'], 'output': job['output'], 'files': len(job['files']),
+              'rows': None, 'seconds': None, 'error': None, 'changes': None}
+    try:
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+        summary = merge_excel_files(job['files'], job['output'], **merge_options)
+        result['rows'] = summary['rows']
+        if summary.get('diff') is not None:
+            result['changes'] = len(summary['diff']['changes'])
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_jobs(jobs, max_jobs=None, on_result=None, **merge_options):
+    """并行运行多个项目，返回与 jobs 顺序一致的结果列表
+
+    max_jobs 为同时运行的项目数，None 表示 CPU 核心数。未指定 workers 时每个项目串行读取，
+    避免项目间并行与文件间并行叠加后进程数过多。on_result(result) 在每个项目结束时调用。
+    """
+    merge_options.setdefault('workers', 1)
+    max_jobs = max_jobs or os.cpu_count() or 1
+    results = [None] * len(jobs)
+
+    if max_jobs <= 1 or len(jobs) <= 1:
+        for index, job in enumerate(jobs):
+            results[index] = run_job(job, **merge_options)
+            if on_result is not None:
+                on_result(results[index])
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(max_jobs, len(jobs))) as executor:
+        futures = {executor.submit(run_job, job, **merge_options): index
+                   for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # 子进程异常退出（如内存不足被终止）
+                results[index] = {'name': jobs[index]['name'], 'output': jobs[index]['output'],
+                                  'files': len(jobs[index]['files']), 'rows': None,
+                                  'seconds': None, 'error': f'{type(e).__name__}: {e}',
+                                  'changes': None}
+            if on_result is not None:
+                on_result(results[index])
+    return results
+
+
+def format_results(results):
+    """每个项目一行的汇总文本"""
+    lines = []
+    for result in results:
+        seconds = '-' if result['seconds'] is None else f"{result['seconds']:.1f}s"
+        if result['error'] is None:
+            changes = '' if result['changes'] is None else f"{result['changes']} 个规格有变化，"
+            lines.append(f"成功  {result['name']}：{result['files']} 个文件，{result['rows']} 行，"
+                         f"{changes}{seconds} -> {result['output']}")
+        else:
+            lines.append(f"失败  {result['name']}：{result['files']} 个文件，{seconds}，"
+                         f"{result['error']}")
+    failed = sum(1 for result in results if result['error'] is not None)
+    lines.append(f"共 {len(results)} 个项目，成功 {len(results) - failed} 个，失败 {failed} 个")
+    return '\n'.join(lines)
@@ -0,0 +1,268 @@
+"""分块合并：内存占用与输入总行数无关
+
+用 openpyxl 的 read_only 模式逐行读取输入工作表，每 chunk_rows 行组成一个小 DataFrame：
+    - 直接追加到输出的 '总'、'非标总' 和各表面处理明细表（write_only 模式，写入临时文件）；
+    - 按 (表面处理, 材料, 规格) 汇总数量后累加到运行中的合计表。
+所有输入读完后由合计表生成各材料汇总表。内存中只保留当前分块和合计表，
+合计表的大小取决于不同规格的数量而不是总行数。表头只读取每张工作表的第一行。
+openpyxl 逐行解析时每行会保留一个约 100 字节的空 XML 元素，读完该工作表后释放，
+因此单张工作表（最多 1048576 行）额外占用约 100 MB，不随工作表和文件数量累积。
+
+与普通模式的差异：
+    - .xls 无法逐行读取，按工作表整张读入后再分块；
+    - 表头范围之外的单元格被忽略；
+    - 输出表头不加格式（与 streaming=True 相同），不使用解析缓存。
+"""
+import os
+import time
+
+import pandas as pd
+
+from material_catalog import load_catalog
+from material_types import SURFACE_TREATMENTS
+from merge_excel import (REQUIRED_COLUMNS, _check_cancel, _excel_engine, _read_options,
+                         aggregate_materials, append_frame_rows, build_material_sheets,
+                         collect_diagnostics, read_excel_sheets, split_surface_treatments,
+                         temp_output_path)
+from merge_incremental import TOTAL_KEYS, combine_totals
+from merge_metrics import measure
+
+# 每个分块的行数，越大越快，内存占用也越高
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def _header_names(values):
+    """与 pandas.read_excel 相同的列名：空表头为 'Unnamed: 序号'，重复的列名依次加 '.1'、'.2'"""
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    names = []
+    for index, value in enumerate(values):
+        base = f'Unnamed: {index}' if value is None else value
+        name, count = base, 0
+        while name in names:
+            count += 1
+            name = f'{base}.{count}'
+        names.append(name)
+    return names
+
+
+def _open_workbook(file_path):
+    from openpyxl import load_workbook
+    return load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+
+def _sheet_headers(file_path):
+    """每张工作表的列名，只读取第一行，内存占用与工作表行数无关"""
+    if _excel_engine(file_path) == 'xlrd':
+        import xlrd
+        book = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            headers = []
+            for index in range(book.nsheets):
+                sheet = book.sheet_by_index(index)
+                row = sheet.row_values(0) if sheet.nrows else []
+                # xlrd 把空单元格读成 ''
+                headers.append(_header_names(None if value == '' else value for value in row))
+                book.unload_sheet(index)
+            return headers
+        finally:
+            book.release_resources()
+
+    workbook = _open_workbook(file_path)
+    try:
+        headers = []
+        for worksheet in workbook.worksheets:
+            worksheet.reset_dimensions()
+            headers.append(_header_names(
+                next(worksheet.iter_rows(max_row=1, values_only=True), ())))
+        return headers
+    finally:
+        workbook.close()
+
+
+def scan_columns(file_paths, columns=None):
+    """只读取每张工作表的表头，按首次出现的顺序返回所有列名，与拼接后的列顺序一致"""
+    union = []
+    for file_path in file_paths:
+        for names in _sheet_headers(file_path):
+            union.extend(name for name in names
+                         if name not in union and (columns is None or name in columns))
+    return union
+
+
+def iter_sheet_chunks(file_path, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """按工作表顺序逐块读取，yield (工作表名, DataFrame)，每块最多 chunk_rows 行
+
+    与 pandas 一样保留中间的空行、去掉末尾的空行。columns 不为空时只保留其中的列。
+    """
+    if _excel_engine(file_path) == 'xlrd':
+        for sheet_name, df in read_excel_sheets(file_path, columns=columns, reader='default'):
+            for start in range(0, len(df), chunk_rows):
+                yield sheet_name, df.iloc[start:start + chunk_rows]
+        return
+
+    def to_frame(rows, names):
+        df = pd.DataFrame.from_records(rows, columns=names)
+        if columns is not None:
+            df = df[[name for name in names if name in columns]]
+        return df
+
+    workbook = _open_workbook(file_path)
+    try:
+        for worksheet in workbook.worksheets:
+            # 部分程序写出的文件尺寸信息不准确，与 pandas 一样按实际单元格读取
+            worksheet.reset_dimensions()
+            rows = worksheet.iter_rows(values_only=True)
+            names = _header_names(next(rows, ()))
+            width = len(names)
+            if not width:
+                continue
+            empty_row = (None,) * width
+            chunk = []
+            blank = 0
+            for row in rows:
+                row = row[:width]
+                if all(value is None for value in row):
+                    # 先记下空行数，后面还有数据时才补上，末尾的空行不输出
+                    blank += 1
+                    continue
+                chunk.extend([empty_row] * blank)
+                blank = 0
+                chunk.append(row + (None,) * (width - len(row)))
+                if len(chunk) >= chunk_rows:
+                    yield worksheet.title, to_frame(chunk, names)
+                    chunk = []
+            if chunk:
+                yield worksheet.title, to_frame(chunk, names)
+    finally:
+        workbook.close()
+
+
+def merge_chunked(file_paths, output_path, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+                  progress=None, cancel=None, metrics=None):
+    """分块合并，输出与 merge_excel_files 相同的工作表
+
+    返回 {'rows', 'memory_bytes', 'memory_saved', 'diagnostics', 'skipped_columns', 'totals'}，
+    memory_* 始终为 None，totals 为按 (表面处理, 材料, 规格) 汇总的数量。
+    columns、progress、cancel、metrics 见 merge_excel_files。
+    """
+    from openpyxl import Workbook
+
+    for file_path in file_paths:
+        _excel_engine(file_path)
+    columns = _read_options(columns, False)[0]
+
+    with measure(metrics, 'stage', 'scan'):
+        names = scan_columns(file_paths)
+    union = [name for name in names if columns is None or name in columns]
+    missing = [column for column in REQUIRED_COLUMNS if column not in union]
+    if missing:
+        raise ValueError(f"输入文件中缺少列：{'、'.join(missing)}")
+    header = [str(column) for column in union]
+
+    workbook = Workbook(write_only=True)
+    # 明细表：'总'、'非标总' 和各表面处理（键为表面处理代码）的明细总表
+    detail_names = {'总': '总', '非标总': '非标总'}
+    detail_names.update((treatment, f'{name}{treatment}总')
+                        for treatment, name in SURFACE_TREATMENTS.items())
+    details = {}
+    detail_rows = {}
+    for key, name in detail_names.items():
+        details[key] = workbook.create_sheet(name)
+        details[key].append(header)
+        detail_rows[key] = 0
+
+    totals = pd.DataFrame(columns=TOTAL_KEYS + ['数量'])
+    rows = 0
+    try:
+        with measure(metrics, 'stage', 'read') as stage:
+            for index, file_path in enumerate(file_paths):
+                start = time.perf_counter()
+                file_rows = 0
+                for _, chunk in iter_sheet_chunks(file_path, columns, chunk_rows):
+                    _check_cancel(cancel)
+                    chunk = chunk.reindex(columns=union)
+                    chunk['数量'] = pd.to_numeric(chunk['数量'], errors='coerce')
+                    non_standard, treated, materials = split_surface_treatments(chunk)
+
+                    parts = [('总', chunk), ('非标总', non_standard)]
+                    parts.extend((treatment, treated[treated['表面处理'] == treatment])
+                                 for treatment in SURFACE_TREATMENTS)
+                    for key, part in parts:
+                        append_frame_rows(details[key], part)
+                        detail_rows[key] += len(part)
+                    totals = combine_totals([totals, aggregate_materials(treated, materials)])
+                    file_rows += len(chunk)
+
+                rows += file_rows
+                if metrics is not None:
+                    metrics.record('file', file_path, time.perf_counter() - start,
+                                   rows=file_rows, bytes_read=os.path.getsize(file_path))
+                if progress is not None:
+                    progress('read', index + 1, len(file_paths), file_rows)
+            stage['rows'] = rows
+            stage['bytes_read'] = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+        _check_cancel(cancel)
+        if progress is not None:
+            progress('process', 0, 1, rows)
+        with measure(metrics, 'stage', 'materials') as stage:
+            material_sheets = build_material_sheets(totals)
+            diagnostics = collect_diagnostics(material_sheets)
+            stage['rows'] = len(totals)
+        if progress is not None:
+            progress('process', 1, 1, rows)
+
+        _check_cancel(cancel)
+        with measure(metrics, 'stage', 'write') as stage:
+            order = ['总']
+            if detail_rows['非标总']:
+                order.append('非标总')
+            extra = []
+            materials = load_catalog().materials
+            for treatment in SURFACE_TREATMENTS:
+                if not detail_rows[treatment]:
+                    continue
+                order.append(detail_names[treatment])
+                for material in materials:
+                    if (treatment, material) in material_sheets:
+                        extra.append((f'{material}{treatment}',
+                                      material_sheets[(treatment, material)][0]))
+                        order.append(extra[-1][0])
+            if diagnostics is not None:
+                extra.append(('规格异常', diagnostics))
+                order.append('规格异常')
+
+            for sheet_name, df in extra:
+                worksheet = workbook.create_sheet(sheet_name)
+                worksheet.append([str(column) for column in df.columns])
+                append_frame_rows(worksheet, df)
+            # 没有数据的明细表不输出，其余按普通模式的顺序排列
+            for worksheet in details.values():
+                if worksheet.title not in order:
+                    worksheet.close()
+                    workbook.remove(worksheet)
+            for position, sheet_name in enumerate(order):
+                workbook.move_sheet(sheet_name, position - workbook.sheetnames.index(sheet_name))
+            # 先保存到临时文件再替换，保存失败时原有的输出文件保持不变
+            tmp_path = temp_output_path(output_path)
+            try:
+                workbook.save(tmp_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, output_path)
+            stage['rows'] = rows + sum(len(df) for _, df in extra)
+        if progress is not None:
+            progress('write', 1, 1, rows)
+    except BaseException:
+        # 取消或出错时关闭明细表的临时文件，输出文件只在最后替换，不需要清理
+        for worksheet in workbook.worksheets:
+            worksheet.close()
+        raise
+
+    return {'rows': rows, 'memory_bytes': None, 'memory_saved': None,
+            'diagnostics': diagnostics, 'totals': totals,
+            'skipped_columns': [name for name in names if name not in union]}
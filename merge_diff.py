@@ -0,0 +1,180 @@
+"""合并结果对比
+
+每次合并后把按 (表面处理, 材料, 规格) 汇总的数量保存为快照（输出路径 + '.snapshot'），
+上一次的快照改名为 '.snapshot.prev'。对比时只读取两个快照，按 (表面处理, 材料, 规格)
+做哈希连接，列出新增、删除和数量变化的规格，不必打开两个输出工作簿。
+快照的行数等于不同规格的数量，几千个规格时保存和对比只需几十毫秒，20 万个约 0.5 秒。
+
+用法：
+    python merge_diff.py 输出文件                  对比最近两次合并的结果
+    python merge_diff.py 旧快照 新快照             对比任意两个快照
+    python merge_diff.py ... --csv 文件            另外把变化明细写成 CSV
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from merge_metrics import measure
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = '.snapshot'
+PREVIOUS_SUFFIX = '.prev'
+SNAPSHOT_KEYS = ['表面处理', '材料', '规格']
+CHANGE_COLUMNS = SNAPSHOT_KEYS + ['上次数量', '本次数量', '变化', '状态']
+# 变化明细中的状态，也是汇总表的列顺序
+CHANGE_STATES = ('新增', '删除', '变化')
+
+
+def snapshot_path_for(output_path):
+    return output_path + SNAPSHOT_SUFFIX
+
+
+def make_snapshot(totals):
+    """由 aggregate_materials 的结果生成快照"""
+    totals = totals[SNAPSHOT_KEYS + ['数量']].reset_index(drop=True)
+    for column in ('表面处理', '材料'):
+        totals[column] = totals[column].astype(str).astype('category')
+    return {'version': SNAPSHOT_VERSION, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'totals': totals}
+
+
+def load_snapshot(path):
+    """读取快照，不存在、损坏或版本不同时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def save_snapshot(path, snapshot):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def diff_totals(old, new):
+    """对比两次的汇总数量，返回变化明细，列见 CHANGE_COLUMNS，数量相同的规格不列出"""
+    def keyed(totals):
+        totals = totals[SNAPSHOT_KEYS + ['数量']].copy()
+        # 两次的 category 取值可能不同，统一为 object 后再连接
+        for column in SNAPSHOT_KEYS:
+            totals[column] = totals[column].astype(object)
+        return totals
+
+    joined = keyed(old).merge(keyed(new), on=SNAPSHOT_KEYS, how='outer',
+                              suffixes=('_old', '_new'), indicator=True)
+    joined = joined.rename(columns={'数量_old': '上次数量', '数量_new': '本次数量'})
+    joined['状态'] = joined['_merge'].map({'right_only': '新增', 'left_only': '删除',
+                                         'both': '变化'}).astype(object)
+    joined['变化'] = joined['本次数量'].fillna(0) - joined['上次数量'].fillna(0)
+    # 只容忍浮点累加顺序造成的误差，默认的相对误差会把 100000 -> 100001 当成没有变化
+    unchanged = (joined['状态'] == '变化') & np.isclose(
+        joined['本次数量'].fillna(0), joined['上次数量'].fillna(0), rtol=0, atol=1e-9)
+    changes = joined.loc[~unchanged, CHANGE_COLUMNS]
+    return changes.sort_values(SNAPSHOT_KEYS, key=lambda column: column.astype(str),
+                               ignore_index=True)
+
+
+def summarize_changes(changes):
+    """按 (表面处理, 材料) 统计新增、删除、变化的规格数和数量变化合计"""
+    counts = pd.crosstab([changes['表面处理'], changes['材料']], changes['状态'])
+    counts = counts.reindex(columns=list(CHANGE_STATES), fill_value=0).rename_axis(columns=None)
+    counts['数量变化'] = changes.groupby(['表面处理', '材料'])['变化'].sum()
+    return counts.reset_index()
+
+
+def diff_snapshots(old, new):
+    """对比两个快照，返回 {'previous', 'current', 'changes', 'summary'}"""
+    changes = diff_totals(old['totals'], new['totals'])
+    return {'previous': old['created'], 'current': new['created'], 'changes': changes,
+            'summary': summarize_changes(changes)}
+
+
+def record_run(output_path, totals, metrics=None):
+    """保存本次合并的快照并与上一次对比，没有上一次的快照时返回 None
+
+    metrics 见 merge_metrics，记录一条 'diff' 阶段。
+    """
+    path = snapshot_path_for(output_path)
+    with measure(metrics, 'stage', 'diff') as stage:
+        snapshot = make_snapshot(totals)
+        previous = load_snapshot(path)
+        report = None if previous is None else diff_snapshots(previous, snapshot)
+        if previous is not None:
+            os.replace(path, path + PREVIOUS_SUFFIX)
+        save_snapshot(path, snapshot)
+        stage['rows'] = len(totals)
+    return report
+
+
+def _format_number(value):
+    if pd.isna(value):
+        return '-'
+    return f'{value:g}'
+
+
+def format_report(report, limit=50):
+    """变化报告的文本，明细最多列出 limit 行"""
+    changes = report['changes']
+    if changes.empty:
+        return f"与上次合并（{report['previous']}）相比没有变化"
+    counts = changes['状态'].value_counts()
+    lines = [f"与上次合并（{report['previous']}）相比："
+             + '，'.join(f"{state} {counts.get(state, 0)} 个规格" for state in CHANGE_STATES)]
+    for row in report['summary'].itertuples(index=False):
+        parts = '，'.join(f"{state} {getattr(row, state)}" for state in CHANGE_STATES
+                         if getattr(row, state))
+        lines.append(f"  {row.材料}{row.表面处理}：{parts}，数量 {row.数量变化:+g}")
+    lines.append('')
+    for row in changes.head(limit).itertuples(index=False):
+        lines.append(f"  {row.状态}  {row.材料}{row.表面处理}  {row.规格}："
+                     f"{_format_number(row.上次数量)} -> {_format_number(row.本次数量)}")
+    if len(changes) > limit:
+        lines.append(f"  ……另有 {len(changes) - limit} 个规格")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次合并的汇总结果')
+    parser.add_argument('paths', nargs='+', metavar='路径',
+                        help='一个输出文件（对比最近两次合并），或旧、新两个快照文件')
+    parser.add_argument('--csv', metavar='文件', help='把变化明细写成 CSV 文件')
+    parser.add_argument('--limit', type=int, default=50, help='最多打印的明细行数')
+    args = parser.parse_args(argv)
+
+    if len(args.paths) == 1:
+        path = snapshot_path_for(args.paths[0])
+        old_path, new_path = path + PREVIOUS_SUFFIX, path
+    elif len(args.paths) == 2:
+        old_path, new_path = args.paths
+    else:
+        parser.error('只能指定一个输出文件或两个快照文件')
+
+    snapshots = []
+    for path in (old_path, new_path):
+        snapshot = load_snapshot(path)
+        if snapshot is None:
+            print(f"无法读取快照：{path}")
+            return 1
+        snapshots.append(snapshot)
+    report = diff_snapshots(*snapshots)
+    print(format_report(report, args.limit))
+    if args.csv:
+        # 带 BOM 以便 Excel 直接打开
+        report['changes'].to_csv(args.csv, index=False, encoding='utf-8-sig')
+        print(f"变化明细已写出到 {args.csv}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
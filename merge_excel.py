@@ -1,25 +1,91 @@
 import pandas as pd
 import os
-from material_types import MATERIAL_TYPES as material_types
+import re
+import sys
+import time
+import cProfile
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from material_types import FLAT_BAR_LENGTH_RULES, SURFACE_TREATMENTS
+from excel_cache import WorkbookCache
+from material_catalog import CATALOG_PATH_ENV, CatalogError, load_catalog
+from merge_metrics import MergeMetrics, measure
+
+# 后续汇总处理依赖的列，按列读取时总会保留
+REQUIRED_COLUMNS = ['规格', '数量', '表面处理', '是否带腹板']
+# 取值很少的列，压缩读取时转为 category
+CATEGORY_COLUMNS = ['表面处理', '是否带腹板']
+# 规格中包含该关键字的行单独汇总到 '非标总'，不参与刷漆/镀锌分类
+NON_STANDARD_KEYWORD = '非标底座'
+# 带腹板时规格末尾加 ' P' 的前缀
+WEB_PLATE_PREFIXES = ('LDK', 'L4', 'L5')
+# 读取后端：auto 在安装了 python-calamine 时用 calamine，失败或未安装时用 openpyxl/xlrd；
+# calamine、default 分别只用 calamine 或 openpyxl/xlrd
+READERS = ('auto', 'calamine', 'default')
+HAS_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+def classify_materials(specs):
+    """为每个规格确定材料类型，返回 category 列，未匹配的为 NaN，前缀见 material_catalog"""
+    return load_catalog().classify_series(specs)
+
+# 扁钢规格各段之间的分隔符
+FLAT_BAR_SEPARATORS = '-XP'
+
+def compile_flat_bar_rules(rules):
+    """把 {前缀: ({段号: 系数}, 常数)} 编译成 {前缀: (正则, [系数, ...], 常数)}
+
+    正则只捕获公式用到的段，其余段只匹配不捕获；段可以缺少，缺少的段捕获为 NaN。
+    """
+    sep = re.escape(FLAT_BAR_SEPARATORS)
+    compiled = {}
+    for prefix, (weights, constant) in rules.items():
+        last = max(weights)
+        pattern = '^' + re.escape(prefix) + f'(?=[{sep}]|$)'
+        for index in range(1, last + 1):
+            group = '(' if index in weights else '(?:'
+            pattern += f'(?:[{sep}]{group}[^{sep}]*)'
+        pattern += ')?' * last
+        compiled[prefix] = (re.compile(pattern), [weights[i] for i in sorted(weights)], constant)
+    return compiled
+
+_FLAT_BAR_RULES = compile_flat_bar_rules(FLAT_BAR_LENGTH_RULES)
+_FLAT_BAR_PREFIX = re.compile(f'^([^{re.escape(FLAT_BAR_SEPARATORS)}]*)')
+
+def flat_bar_lengths(specs, rules=None):
+    """按规则计算每个扁钢规格的长度，没有对应规则的规格为 NaN
+
+    相同的规格只解析一次；先取出每个规格的前缀，再对每条规则只在该前缀的规格上提取需要的段。
+    rules 为 compile_flat_bar_rules 的结果，默认使用 FLAT_BAR_LENGTH_RULES。
+    """
+    if rules is None:
+        rules = _FLAT_BAR_RULES
+    codes, uniques = pd.factorize(specs.astype(str))
+    uniques = pd.Series(uniques, dtype=object)
+    prefixes = uniques.str.extract(_FLAT_BAR_PREFIX, expand=False)
+    lengths = pd.Series(float('nan'), index=uniques.index)
+    for prefix, (pattern, weights, constant) in rules.items():
+        matched = prefixes == prefix
+        if not matched.any():
+            continue
+        fields = uniques[matched].str.extract(pattern)
+        values = fields.apply(pd.to_numeric, errors='coerce').fillna(0)
+        lengths[matched] = values.mul(weights, axis=1).sum(axis=1) + constant
+    return pd.Series(lengths.to_numpy()[codes], index=specs.index)
 
 def process_flat_bars(filtered):
-    """对扁钢材料进行长度计算"""
+    """对扁钢材料进行长度计算，长度公式见 material_types.FLAT_BAR_LENGTH_RULES"""
     if '规格' not in filtered.columns:
         return filtered
         
     if '长度' not in filtered.columns:
         filtered.insert(1, '长度', 0)
     
-    split_cols = filtered['规格'].str.split(r'[-XP]', expand=True)
-    a = split_cols[0].fillna('0')
-    b = pd.to_numeric(split_cols[1], errors='coerce').fillna(0)
-    c = pd.to_numeric(split_cols[2], errors='coerce').fillna(0)
-    d = pd.to_numeric(split_cols[3], errors='coerce').fillna(0)
-    e = pd.to_numeric(split_cols[4], errors='coerce').fillna(0)
-    
-    filtered.loc[a == 'FB', '长度'] = c + 2*d - 10
-    filtered.loc[a == 'FBF', '长度'] = c + 2*e - 10
-    filtered.loc[a == 'FBZ', '长度'] = c + 2*d + 250 - 15
+    lengths = flat_bar_lengths(filtered['规格']).fillna(filtered['长度'])
+    if lengths.notna().all() and (lengths == lengths.round()).all():
+        # 长度都是整数时保持整数列，输出中不显示小数
+        lengths = lengths.astype('int64')
+    filtered['长度'] = lengths
 
     filtered = filtered.groupby('规格', as_index=False).agg({
                         '长度': 'first',
@@ -95,8 +161,12 @@ def process_angle_steel(filtered):
     
     return result_df
 
-def process_steel_pipe(filtered):
-    """处理钢管材料"""
+def process_steel_pipe(filtered, diagnostics=None):
+    """处理钢管材料
+
+    规格舍弃 'Ф' 前的字符后按 '-' 拆成规格和长度，拆分后相同的 (规格, 长度) 重新汇总数量。
+    长度不是整数的规格保留拆出的规格、长度记为 0，并追加到 diagnostics 列表中。
+    """
     if filtered.empty:
         return filtered
         
@@ -105,122 +175,786 @@ def process_steel_pipe(filtered):
         '数量': 'sum'
     })
     
-    # 添加长度列
-    filtered.insert(1, '长度', 0)
-    
-    # 处理规格字符串
-    for index, row in filtered.iterrows():
-        try:
-            spec = str(row['规格'])
-            # 舍弃'Ф'前所有字符串
-            if 'Ф' in spec:
-                spec = spec[spec.find('Ф'):]
-            # 用'-'分隔
-            parts = spec.split('-')
-            if len(parts) > 1:
-                filtered.at[index, '规格'] = parts[0]
-                filtered.at[index, '长度'] = int(parts[1])
-        except Exception as e:
-            print(f"处理钢管规格时出错: {e}, 规格: {spec}")
-            continue
+    # 舍弃'Ф'前所有字符串，再用'-'分隔出规格和长度
+    specs = filtered['规格'].astype(str)
+    parts = specs.str.replace(r'^[^Ф]*(?=Ф)', '', regex=True).str.extract(r'^([^-]*)-([^-]*)')
+    has_length = parts[0].notna()
+    is_integer = parts[1].str.fullmatch(r'\s*\+?\d+\s*').fillna(False).astype(bool)
+    lengths = pd.to_numeric(parts[1].where(is_integer), errors='coerce')
+
+    invalid = has_length & ~is_integer
+    if diagnostics is not None and invalid.any():
+        diagnostics.append(pd.DataFrame({
+            '规格': filtered.loc[invalid, '规格'],
+            '数量': filtered.loc[invalid, '数量'],
+            '原因': '长度不是整数',
+        }))
+
+    filtered['规格'] = parts[0].where(has_length, filtered['规格'])
+    filtered.insert(1, '长度', lengths.fillna(0).astype('int64'))
+
+    # 不同写法的规格拆分后可能相同，重新汇总
+    filtered = filtered.groupby(['规格', '长度'], as_index=False).agg({
+        '数量': 'sum'
+    })
     
     return filtered
 
-def merge_excel_files(file_paths, output_path):
-    merged_df = pd.DataFrame()
-    
+class MergeCancelled(Exception):
+    """合并过程被取消"""
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise MergeCancelled("合并已取消")
+
+def _excel_engine(file_path):
+    """根据扩展名选择读取引擎"""
+    if file_path.endswith('.xlsx'):
+        return 'openpyxl'
+    elif file_path.endswith('.xls'):
+        return 'xlrd'
+    raise ValueError("文件格式不支持：仅支持 .xlsx 和 .xls 文件")
+
+def _reader_engines(file_path, reader='auto'):
+    """按读取后端返回依次尝试的引擎列表，见 READERS"""
+    engine = _excel_engine(file_path)
+    if reader == 'default':
+        return [engine]
+    if reader == 'calamine':
+        if not HAS_CALAMINE:
+            raise ValueError("未安装 python-calamine，无法使用 calamine 读取")
+        return ['calamine']
+    if reader == 'auto':
+        return ['calamine', engine] if HAS_CALAMINE else [engine]
+    raise ValueError(f"未知的读取后端：{reader}，可选 {', '.join(READERS)}")
+
+def _with_engines(file_path, reader, read):
+    """调用 read(engine)，失败时依次改用后面的引擎，最后一个引擎的异常照常抛出"""
+    engines = _reader_engines(file_path, reader)
+    for engine in engines[:-1]:
+        try:
+            return read(engine)
+        except Exception:
+            # calamine 不支持的文件（如部分旧版 .xls）交给 openpyxl/xlrd
+            pass
+    return read(engines[-1])
+
+def _list_sheet_names(file_path, reader='auto'):
+    def read(engine):
+        with pd.ExcelFile(file_path, engine=engine) as xls:
+            return xls.sheet_names
+    return _with_engines(file_path, reader, read)
+
+def _read_options(columns, compact):
+    """按列读取的选项，同时作为缓存键的一部分"""
+    if columns is not None:
+        columns = tuple(REQUIRED_COLUMNS) + tuple(c for c in columns if c not in REQUIRED_COLUMNS)
+    return columns, bool(compact)
+
+def compact_dtypes(df):
+    """数量转为数值，表面处理/是否带腹板转为 category"""
+    if '数量' in df.columns:
+        df['数量'] = pd.to_numeric(df['数量'], errors='coerce')
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+def read_excel_sheets(file_path, sheet_names=None, columns=None, compact=False, timings=None,
+                      reader='auto'):
+    """读取一个工作簿，返回 [(工作表名, DataFrame), ...]，sheet_names 为空时读取全部工作表
+
+    columns 不为空时只读取其中列出的列，没有读取的列名记在 df.attrs['skipped_columns']。
+    compact 为 True 时读取后立即压缩列类型，压缩前的内存占用记在 df.attrs['memory_before']。
+    timings 为列表时追加每张工作表的解析耗时（秒）。reader 见 READERS，
+    calamine 读取失败时整个工作簿改用 openpyxl/xlrd 重新读取。
+    """
+    def read(engine):
+        sheets, sheet_timings = [], []
+        with pd.ExcelFile(file_path, engine=engine) as xls:
+            for sheet_name in xls.sheet_names if sheet_names is None else sheet_names:
+                start = time.perf_counter()
+                skipped = []
+                usecols = None
+                if columns is not None:
+                    def usecols(column):
+                        if column in columns:
+                            return True
+                        skipped.append(column)
+                        return False
+                df = pd.read_excel(xls, sheet_name=sheet_name, header=0, usecols=usecols)
+                if skipped:
+                    df.attrs['skipped_columns'] = list(dict.fromkeys(skipped))
+                if compact:
+                    df.attrs['memory_before'] = int(df.memory_usage(deep=True).sum())
+                    df = compact_dtypes(df)
+                sheets.append((sheet_name, df))
+                sheet_timings.append(time.perf_counter() - start)
+        return sheets, sheet_timings
+
+    sheets, sheet_timings = _with_engines(file_path, reader, read)
+    if timings is not None:
+        timings.extend(sheet_timings)
+    return sheets
+
+def _read_task(file_path, sheet_names, columns, compact, reader):
+    """进程池任务：解析工作表并带回每张表的耗时"""
+    timings = []
+    return read_excel_sheets(file_path, sheet_names, columns, compact, timings, reader), timings
+
+def read_excel_files(file_paths, workers=1, cache=None, columns=None, compact=False,
+                     progress=None, cancel=None, metrics=None, reader='auto'):
+    """读取所有输入文件的全部工作表，按文件顺序、工作表顺序返回 DataFrame 列表
+
+    参数见 read_workbooks。
+    """
+    workbooks = read_workbooks(file_paths, workers=workers, cache=cache, columns=columns,
+                               compact=compact, progress=progress, cancel=cancel,
+                               metrics=metrics, reader=reader)
+    return [df for sheets in workbooks for _, df in sheets]
+
+def read_workbooks(file_paths, workers=1, cache=None, columns=None, compact=False,
+                   progress=None, cancel=None, metrics=None, reader='auto'):
+    """读取所有输入文件，返回与 file_paths 一一对应的 [(工作表名, DataFrame), ...] 列表
+
+    workers 大于 1 时使用进程池并行解析，None 表示使用全部 CPU 核心。
+    cache 为 WorkbookCache 时先查缓存，只解析未命中的文件，解析结果再写回缓存。
+    columns 不为空时只读取 REQUIRED_COLUMNS 和 columns 中的列，compact 见 compact_dtypes。
+    progress、cancel、metrics 见 merge_excel_files，每读完一个文件报告一次。
+    reader 为读取后端，见 READERS。各后端读取结果相同，缓存不区分后端。
+    每个文件内的工作表始终按原顺序排列，与串行读取一致。
+    """
     for file_path in file_paths:
-        if file_path.endswith('.xlsx'):
-            xls = pd.ExcelFile(file_path, engine='openpyxl')
-        elif file_path.endswith('.xls'):
-            xls = pd.ExcelFile(file_path, engine='xlrd')
+        _reader_engines(file_path, reader)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    options = _read_options(columns, compact)
+
+    results = [None] * len(file_paths)
+    files_done = 0
+
+    def file_done(index, seconds, timings=None):
+        """timings 为 None 表示结果来自缓存"""
+        nonlocal files_done
+        if timings is not None and cache is not None:
+            cache.put(file_paths[index], results[index], options)
+        files_done += 1
+        rows = sum(len(df) for _, df in results[index])
+        if metrics is not None:
+            metrics.record('cache' if timings is None else 'file', file_paths[index], seconds,
+                           rows=rows, bytes_read=os.path.getsize(file_paths[index]))
+            for (sheet_name, df), sheet_seconds in zip(results[index], timings or []):
+                metrics.record('sheet', f'{os.path.basename(file_paths[index])}:{sheet_name}',
+                               sheet_seconds, rows=len(df))
+        if progress is not None:
+            progress('read', files_done, len(file_paths), rows)
+
+    pending = []
+    for index, file_path in enumerate(file_paths):
+        if cache is not None:
+            start = time.perf_counter()
+            results[index] = cache.get(file_path, options)
+        if results[index] is None:
+            pending.append(index)
         else:
-           raise ValueError("文件格式不支持：仅支持 .xlsx 和 .xls 文件")
+            file_done(index, time.perf_counter() - start)
 
-        for sheet_name in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sheet_name, header=0)
-            
-            if merged_df.empty:
-                merged_df = df
-            else:
-                merged_df = pd.concat([merged_df, df], ignore_index=True, sort=False)
-    
-    merged_df['数量'] = pd.to_numeric(merged_df['数量'], errors='coerce')
-    
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        merged_df.to_excel(writer, sheet_name='总', index=False)
-        
-        non_standard = merged_df[merged_df['规格'].str.contains('非标底座', na=False)]
-        if not non_standard.empty:
-            non_standard.to_excel(writer, sheet_name='非标总', index=False)
-        
-        y_paint = merged_df[(merged_df['表面处理'] == 'Y') & 
-                          (~merged_df['规格'].str.contains('非标底座', na=False))]
-        g_paint = merged_df[(merged_df['表面处理'] == 'G') & 
-                          (~merged_df['规格'].str.contains('非标底座', na=False))]
-        
-        if not y_paint.empty:
-            y_paint_modified = y_paint.copy()
-            condition = (y_paint_modified['是否带腹板'] == '是') & \
-                       (y_paint_modified['规格'].str.startswith(('LDK', 'L4', 'L5')))
-            y_paint_modified.loc[condition, '规格'] = y_paint_modified.loc[condition, '规格'] + ' P'
-            y_paint_modified.to_excel(writer, sheet_name='刷漆Y总', index=False)
-
-            for material, prefixes in material_types.items():
-                filtered = y_paint_modified[y_paint_modified['规格'].str.startswith(tuple(prefixes))]
-                if not filtered.empty:
-                    filtered = filtered[['规格', '数量']]
-                    if material == '扁钢':
-                        filtered = process_flat_bars(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}Y', index=False)
-                    if material == '基座':
-                        filtered = process_pedestal(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}Y', index=False)
-                    if material == '角钢':
-                        if filtered.empty:
-                            print("filtered 是否为空:", filtered.empty)
-                        filtered = process_angle_steel(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}Y', index=False)
-                    if material == '钢管':
-                        filtered = process_steel_pipe(filtered)
-                    filtered.to_excel(writer, sheet_name=f'{material}Y', index=False)
-
-        if not g_paint.empty:
-            g_paint_modified = g_paint.copy()
-            condition = (g_paint_modified['是否带腹板'] == '是') & \
-                       (g_paint_modified['规格'].str.startswith(('LDK', 'L4', 'L5')))
-            g_paint_modified.loc[condition, '规格'] = g_paint_modified.loc[condition, '规格'] + ' P'
-            g_paint_modified.to_excel(writer, sheet_name='镀锌G总', index=False)
-
-            for material, prefixes in material_types.items():
-                filtered = g_paint_modified[g_paint_modified['规格'].str.startswith(tuple(prefixes))]
-                if not filtered.empty:
-                    filtered = filtered[['规格', '数量']]
-                    if material == '扁钢':
-                        filtered = process_flat_bars(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}G', index=False)
-                    if material == '基座':
-                        filtered = process_pedestal(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}G', index=False)
-                    if material == '角钢':
-                        filtered = process_angle_steel(filtered)
-                        #filtered.to_excel(writer, sheet_name=f'{material}G', index=False)
-                    if material == '钢管':
-                        filtered = process_steel_pipe(filtered)
-                    filtered.to_excel(writer, sheet_name=f'{material}G', index=False)
+    if workers <= 1 or not pending:
+        for index in pending:
+            _check_cancel(cancel)
+            timings = []
+            results[index] = read_excel_sheets(file_paths[index], None, *options, timings, reader)
+            file_done(index, sum(timings), timings)
+    else:
+        tasks = [(index, None) for index in pending]
+        if len(pending) < workers:
+            # 文件数少于进程数时按工作表拆分任务，让大工作簿的多个工作表同时解析
+            tasks = [(index, [sheet_name])
+                     for index in pending
+                     for sheet_name in _list_sheet_names(file_paths[index], reader)]
+        positions = {index: [] for index in pending}
+        for position, (index, _) in enumerate(tasks):
+            positions[index].append(position)
+        parts = [None] * len(tasks)
+        part_timings = [None] * len(tasks)
 
-if __name__ == "__main__":
-    excel_files = [os.path.join(os.getcwd(), f) 
-                  for f in os.listdir() 
-                  if f.endswith('.xlsx') or f.endswith('.xls')]
-    
-    if not excel_files:
-        print("当前目录下未找到Excel文件")
+        with ProcessPoolExecutor(max_workers=min(workers, max(len(tasks), 1))) as executor:
+            futures = {executor.submit(_read_task, file_paths[index], names, *options, reader):
+                           position
+                       for position, (index, names) in enumerate(tasks)}
+            try:
+                for future in as_completed(futures):
+                    _check_cancel(cancel)
+                    position = futures[future]
+                    parts[position], part_timings[position] = future.result()
+                    index = tasks[position][0]
+                    if all(parts[p] is not None for p in positions[index]):
+                        # 按任务提交顺序拼回，保证 '总' 表的行顺序确定
+                        results[index] = [sheet for p in positions[index] for sheet in parts[p]]
+                        timings = [t for p in positions[index] for t in part_timings[p]]
+                        file_done(index, sum(timings), timings)
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    return results
+
+def concat_frames(frames):
+    """一次性拼接所有工作表，列在这里统一对齐
+
+    逐表 concat 每次都会复制已累积的全部数据，耗时和内存随工作表数量平方增长。
+    """
+    # 列按首次出现的顺序取所有工作表的并集，与分块模式扫描表头的结果一致
+    columns = list(dict.fromkeys(column for df in frames for column in df.columns))
+    non_empty = [df for df in frames if not df.empty]
+    if not non_empty:
+        return pd.DataFrame(columns=columns)
+    # 只有表头的工作表不参与拼接，以免影响列类型，但保留它们的列
+    merged_df = pd.concat(non_empty, ignore_index=True, sort=False)
+    if list(merged_df.columns) != columns:
+        merged_df = merged_df.reindex(columns=columns)
+    return merged_df
+
+def _resolve_cache(cache):
+    """cache 参数可以是 True（默认缓存目录）、False/None（不使用缓存）或 WorkbookCache 实例"""
+    if cache is True:
+        return WorkbookCache()
+    return cache or None
+
+def split_surface_treatments(merged_df):
+    """拆出非标底座明细和需要按表面处理汇总的明细
+
+    返回 (非标底座明细, 表面处理明细, 材料列)。表面处理明细只含 SURFACE_TREATMENTS 中的行，
+    带腹板的 LDK/L4/L5 规格已加 ' P' 后缀，材料列与其行索引对齐。
+    """
+    # 规格列可能整列是数字或混有数字，匹配时用字符串视图，输出的规格保持原值
+    specs = merged_df['规格']
+    text = specs.astype(str).where(specs.notna())
+    is_non_standard = text.str.contains(NON_STANDARD_KEYWORD, na=False)
+    treated = merged_df[merged_df['表面处理'].isin(list(SURFACE_TREATMENTS)) & ~is_non_standard].copy()
+    text = text[treated.index]
+
+    condition = (treated['是否带腹板'] == '是') & \
+               (text.str.startswith(WEB_PLATE_PREFIXES, na=False))
+    if condition.any():
+        # 数字规格不会以这些前缀开头，只有文本规格会加后缀
+        text = text.where(~condition, text + ' P')
+        treated.loc[condition, '规格'] = text[condition]
+
+    materials = pd.Series(classify_materials(text), index=treated.index, name='材料')
+    return merged_df[is_non_standard], treated, materials
+
+def aggregate_materials(treated, materials):
+    """按 (表面处理, 材料, 规格) 汇总数量，各材料处理函数都从这张汇总表取数"""
+    totals = treated.groupby([treated['表面处理'], materials, treated['规格']],
+                             observed=True)['数量'].sum()
+    return totals.reset_index()
+
+# 各材料汇总表的处理函数，未列出的材料直接输出 (规格, 数量)
+MATERIAL_PROCESSORS = {
+    '基座': process_pedestal,
+    '扁钢': process_flat_bars,
+    '角钢': process_angle_steel,
+    '钢管': process_steel_pipe,
+}
+
+def _process_material(group, treatment, material, diagnostics):
+    """用 MATERIAL_PROCESSORS 中对应的函数生成一张材料汇总表"""
+    filtered = group[['规格', '数量']].reset_index(drop=True)
+    process = MATERIAL_PROCESSORS.get(material)
+    if process is process_steel_pipe:
+        problems = []
+        filtered = process(filtered, problems)
+        if diagnostics is not None:
+            diagnostics.extend(p.assign(表面处理=treatment, 材料=material) for p in problems)
+    elif process is not None:
+        filtered = process(filtered)
+    return filtered
+
+def build_material_sheets(totals, keys=None):
+    """对每个 (表面处理, 材料) 调用对应的处理函数
+
+    返回 {(表面处理, 材料): (汇总表, [规格异常表, ...])}，keys 不为空时只计算其中的组合。
+    """
+    groups = dict(list(totals.groupby(['表面处理', '材料'], observed=True)))
+    sheets = {}
+    for treatment in SURFACE_TREATMENTS:
+        for material in load_catalog().materials:
+            key = (treatment, material)
+            if key in groups and (keys is None or key in keys):
+                problems = []
+                sheets[key] = (_process_material(groups[key], treatment, material, problems),
+                               problems)
+    return sheets
+
+def build_output_sheets(merged_df, material_sheets=None, split=None):
+    """生成输出工作簿的全部工作表，返回 ([(工作表名, DataFrame), ...], 规格异常表或 None)
+
+    工作表顺序：总、非标总，然后按 SURFACE_TREATMENTS 的顺序输出每种表面处理的明细总表
+    和材料目录顺序的各材料汇总表，最后是规格异常。
+    material_sheets 为 build_material_sheets 的结果，为 None 时由 merged_df 重新汇总计算。
+    split 为 split_surface_treatments(merged_df) 的结果，已经拆分过时传入以免重复计算。
+    """
+    if split is None:
+        split = split_surface_treatments(merged_df)
+    non_standard, treated, materials = split
+    if material_sheets is None:
+        material_sheets = build_material_sheets(aggregate_materials(treated, materials))
+
+    sheets = [('总', merged_df)]
+    if not non_standard.empty:
+        sheets.append(('非标总', non_standard))
+
+    details = dict(list(treated.groupby('表面处理', observed=True, sort=False)))
+    for treatment, name in SURFACE_TREATMENTS.items():
+        if treatment not in details:
+            continue
+        sheets.append((f'{name}{treatment}总', details[treatment]))
+        for material in load_catalog().materials:
+            if (treatment, material) in material_sheets:
+                sheets.append((f'{material}{treatment}', material_sheets[(treatment, material)][0]))
+
+    diagnostics_df = collect_diagnostics(material_sheets)
+    if diagnostics_df is not None:
+        # 无法解析的规格集中写到一张表，不再逐行打印
+        sheets.append(('规格异常', diagnostics_df))
+    return sheets, diagnostics_df
+
+def collect_diagnostics(material_sheets):
+    """按表面处理、材料顺序合并各材料汇总表的规格异常，没有异常时返回 None"""
+    materials = load_catalog().materials
+    diagnostics = [problem
+                   for treatment in SURFACE_TREATMENTS
+                   for material in materials
+                   for problem in material_sheets.get((treatment, material), (None, []))[1]]
+    if not diagnostics:
+        return None
+    return pd.concat(diagnostics, ignore_index=True)[['表面处理', '材料', '规格', '数量', '原因']]
+
+# 流式写出时每次转换的行数
+STREAMING_CHUNK_ROWS = 10000
+
+def append_frame_rows(worksheet, df):
+    """把 DataFrame 的数据行追加到 write_only 工作表，空值写成空单元格"""
+    for start in range(0, len(df), STREAMING_CHUNK_ROWS):
+        chunk = df.iloc[start:start + STREAMING_CHUNK_ROWS].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+def _write_sheets_streaming(sheets, output_path, on_sheet, before_save):
+    """用 openpyxl 的 write_only 模式逐行写出，内存中不保留整张表的单元格对象"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    try:
+        for sheet_name, df in sheets:
+            on_sheet(df)
+            worksheet = workbook.create_sheet(sheet_name)
+            worksheet.append([str(column) for column in df.columns])
+            append_frame_rows(worksheet, df)
+    except BaseException:
+        # 中途退出时关闭已创建工作表的临时文件
+        for worksheet in workbook.worksheets:
+            worksheet.close()
+        raise
+    before_save()
+    workbook.save(output_path)
+
+def temp_output_path(output_path):
+    """写出时使用的临时文件，与输出文件在同一目录，扩展名相同以便 ExcelWriter 识别格式"""
+    root, ext = os.path.splitext(output_path)
+    return f'{root}.{os.getpid()}.tmp{ext}'
+
+def write_sheets(sheets, output_path, streaming=False, progress=None, cancel=None,
+                 metrics=None):
+    """写出 [(工作表名, DataFrame), ...]
+
+    streaming 为 False 时使用 pandas 的 ExcelWriter（openpyxl 引擎，表头带格式）；
+    为 True 时逐行流式写出，表头不加格式，适合十万行以上的大表。
+    progress、cancel、metrics 见 merge_excel_files，每写完一张工作表报告一次，
+    保存工作簿另外记录一条名为 '保存工作簿' 的 'output'。
+    先写到临时文件，全部完成后再替换 output_path，取消或出错时原有的输出文件保持不变。
+    """
+    written = 0
+    last_rows = 0
+    last_start = None
+    save_start = None
+
+    def sheet_finished():
+        if metrics is not None:
+            metrics.record('output', sheets[written - 1][0], time.perf_counter() - last_start,
+                           rows=last_rows)
+        if progress is not None:
+            progress('write', written, len(sheets), last_rows)
+
+    def on_sheet(df):
+        # 在开始写下一张表前报告上一张表已完成，并检查是否取消。
+        # 第一张表之前已在打开工作簿前检查过：ExcelWriter 没有任何工作表时退出会抛出
+        # IndexError，覆盖掉 MergeCancelled
+        nonlocal written, last_rows, last_start
+        if written:
+            sheet_finished()
+            _check_cancel(cancel)
+        written += 1
+        last_rows = len(df)
+        last_start = time.perf_counter()
+
+    def before_save():
+        # 最后一张表到此写完，保存工作簿的耗时单独记录
+        nonlocal save_start
+        if written:
+            sheet_finished()
+        save_start = time.perf_counter()
+
+    _check_cancel(cancel)
+    tmp_path = temp_output_path(output_path)
+    try:
+        if streaming:
+            _write_sheets_streaming(sheets, tmp_path, on_sheet, before_save)
+        else:
+            # 退出 with 时才保存工作簿
+            with pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
+                for sheet_name, df in sheets:
+                    on_sheet(df)
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+                before_save()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    if metrics is not None:
+        metrics.record('output', '保存工作簿', time.perf_counter() - save_start)
+
+def merge_excel_files(file_paths, output_path, workers=1, cache=True,
+                      columns=None, compact=False, streaming=False,
+                      progress=None, cancel=None, metrics=None, profile_path=None,
+                      incremental=False, reader='auto', export=None, export_dir=None,
+                      excel=True, chunked=False, chunk_rows=None, diff=False):
+    """合并输入文件并写出汇总工作簿
+
+    返回 {'rows', 'memory_bytes', 'memory_saved', 'diagnostics', 'skipped_columns'}。
+    columns 为 None 时读取全部列；否则只读取 REQUIRED_COLUMNS 加上 columns 中的透传列，
+    '总' 等明细表也只包含这些列。compact 为 True 时压缩列类型并统计节省的内存。
+    streaming 为 True 时流式写出输出工作簿，见 write_sheets。
+
+    progress(stage, done, total, rows) 用于报告进度：stage 为 'read' 时每读完一个文件调用一次，
+    done/total 为文件数；'process' 在汇总前后各调用一次；'write' 时每写完一张工作表调用一次。
+    rows 为这一步涉及的行数。cancel 为带 is_set() 的对象（如 threading.Event），
+    置位后在下一个文件或工作表开始前抛出 MergeCancelled。输出先写到临时文件，
+    取消或出错时临时文件被删除，原有的输出文件保持不变。
+
+    metrics 用于收集每个文件、工作表和阶段的耗时，见 merge_metrics.MergeMetrics。
+    profile_path 不为空时用 cProfile 分析整个合并过程并把统计结果写到该文件
+    （进程池中解析的部分不包含在内），可用 pstats 或 snakeviz 查看。
+
+    incremental 为 True 时在输出文件旁保存状态，下次只处理新增、修改或删除的文件，
+    见 merge_incremental.merge_incremental。reader 为读取后端，见 READERS。
+
+    export 为 'parquet' 或 'feather' 时把所有输出表另外导出为列式文件，写到 export_dir
+    （默认为输出文件名加 '_data' 的目录），summary['export_dir'] 为导出目录，见 merge_export。
+    excel 为 False 时不写 Excel 输出文件，只导出列式文件。
+
+    chunked 为 True 时分块读取和汇总，内存占用与总行数无关，每块 chunk_rows 行，
+    见 merge_chunked。分块模式总是流式写出，不使用 workers、cache、compact 和 reader，
+    不支持增量合并和导出列式文件。
+
+    diff 为 True 时在输出文件旁保存汇总快照并与上一次合并的结果对比，
+    summary['diff'] 为变化报告，没有上一次的快照时为 None，见 merge_diff。
+    """
+    if chunked:
+        if incremental or export is not None:
+            raise ValueError("分块模式不支持增量合并和导出列式文件")
+        # 延迟导入，merge_chunked 依赖本模块
+        from merge_chunked import DEFAULT_CHUNK_ROWS, merge_chunked
+
+        def merge():
+            return merge_chunked(file_paths, output_path, columns=columns,
+                                 chunk_rows=chunk_rows or DEFAULT_CHUNK_ROWS,
+                                 progress=progress, cancel=cancel, metrics=metrics)
     else:
-        output_file = os.path.join(os.getcwd(), 'text.xlsx')
-        
+        if export is not None:
+            from merge_export import check_export_format
+            check_export_format(export)
+        elif not excel:
+            raise ValueError("不写出 Excel 时必须指定导出格式")
+
+        merge_files = _merge_excel_files
+        if incremental:
+            # 延迟导入，merge_incremental 依赖本模块
+            from merge_incremental import merge_incremental as merge_files
+
+        def merge():
+            return merge_files(file_paths, output_path, workers, cache, columns, compact,
+                               streaming, progress, cancel, metrics, reader, export,
+                               export_dir, excel)
+
+    if profile_path is None:
+        summary = merge()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
         try:
-            merge_excel_files(excel_files, output_file)
-            print(f"合并完成，结果已保存到 {output_file}")
-        except Exception as e:
-            print(f"合并过程中发生错误: {str(e)}")
+            summary = merge()
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+
+    totals = summary.pop('totals')
+    if diff:
+        from merge_diff import record_run
+        summary['diff'] = record_run(output_path, totals, metrics)
+    return summary
+
+def _merge_excel_files(file_paths, output_path, workers, cache, columns, compact,
+                       streaming, progress, cancel, metrics, reader, export, export_dir, excel):
+    with measure(metrics, 'stage', 'read') as stage:
+        frames = read_excel_files(file_paths, workers=workers, cache=_resolve_cache(cache),
+                                  columns=columns, compact=compact,
+                                  progress=progress, cancel=cancel, metrics=metrics,
+                                  reader=reader)
+        stage['rows'] = sum(len(df) for df in frames)
+        stage['bytes_read'] = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+    merged_df, summary = merge_frames(frames, compact, metrics)
+    del frames
+    write_merged_output(merged_df, output_path, summary, streaming=streaming,
+                        progress=progress, cancel=cancel, metrics=metrics,
+                        export=export, export_dir=export_dir, excel=excel)
+    return summary
+
+def merge_frames(frames, compact=False, metrics=None):
+    """拼接读取到的工作表并统一数量列类型，返回 (合并明细, summary)
+
+    summary['skipped_columns'] 为按列读取时没有读取的列名，memory_saved 为压缩列类型
+    节省的内存：各工作表压缩前的占用之和减去最终的占用，不包括没有读取的列。
+    """
+    skipped = []
+    memory_before = 0
+    for df in frames:
+        skipped.extend(df.attrs.get('skipped_columns', ()))
+        if compact:
+            memory_before += df.attrs.get('memory_before',
+                                          int(df.memory_usage(deep=True).sum()))
+
+    with measure(metrics, 'stage', 'concat') as stage:
+        merged_df = concat_frames(frames)
+        # 各工作表的读取信息已经汇总到 summary，不再随合并明细传递（导出 Parquet 时会写入元数据）
+        merged_df.attrs = {}
+        merged_df['数量'] = pd.to_numeric(merged_df['数量'], errors='coerce')
+        stage['rows'] = len(merged_df)
+
+    summary = {'rows': len(merged_df), 'memory_bytes': None, 'memory_saved': None,
+               'diagnostics': None, 'skipped_columns': list(dict.fromkeys(skipped))}
+    if compact:
+        with measure(metrics, 'stage', 'compact') as stage:
+            # 不同工作表的 category 取值不同，拼接后会退回 object，这里统一再压缩一次
+            merged_df = compact_dtypes(merged_df)
+            summary['memory_bytes'] = int(merged_df.memory_usage(deep=True).sum())
+            summary['memory_saved'] = memory_before - summary['memory_bytes']
+            stage['rows'] = len(merged_df)
+    return merged_df, summary
+
+def write_merged_output(merged_df, output_path, summary, material_sheets=None, streaming=False,
+                        progress=None, cancel=None, metrics=None, export=None, export_dir=None,
+                        excel=True, totals=None):
+    """汇总并写出输出工作簿，规格异常表记入 summary['diagnostics']
+
+    取消或出错时原有的输出文件保持不变。material_sheets 见 build_output_sheets，
+    export、export_dir、excel 见 merge_excel_files。totals 为 aggregate_materials 的结果，
+    为 None 时由 merged_df 计算；它记入 summary['totals']，供合并结果对比使用。
+    """
+    _check_cancel(cancel)
+    if progress is not None:
+        progress('process', 0, 1, len(merged_df))
+    with measure(metrics, 'stage', 'aggregate') as stage:
+        split = split_surface_treatments(merged_df)
+        if totals is None:
+            totals = aggregate_materials(*split[1:])
+        if material_sheets is None:
+            material_sheets = build_material_sheets(totals)
+        sheets, summary['diagnostics'] = build_output_sheets(merged_df, material_sheets, split)
+        summary['totals'] = totals
+        stage['rows'] = len(merged_df)
+    if progress is not None:
+        progress('process', 1, 1, len(merged_df))
+
+    if export is not None:
+        from merge_export import export_dir_for, write_columnar
+        summary['export_dir'] = export_dir or export_dir_for(output_path)
+        with measure(metrics, 'stage', 'export') as stage:
+            write_columnar(sheets, summary['export_dir'], export,
+                           on_sheet=lambda df: _check_cancel(cancel), metrics=metrics)
+            stage['rows'] = sum(len(df) for _, df in sheets)
+    if not excel:
+        return
+
+    # write_sheets 先写临时文件，取消时原有的输出文件保持不变
+    with measure(metrics, 'stage', 'write') as stage:
+        write_sheets(sheets, output_path, streaming=streaming, progress=progress,
+                     cancel=cancel, metrics=metrics)
+        stage['rows'] = sum(len(df) for _, df in sheets)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='合并 Excel 文件。每个包含 Excel 文件的目录是一个项目，合并为一个输出文件；'
+                    '不指定输入时合并当前目录')
+    parser.add_argument('inputs', nargs='*', metavar='输入',
+                        help='项目目录、Excel 文件或通配符（如 "项目/*/*.xlsx"）')
+    parser.add_argument('-o', '--output', default=None, metavar='模板',
+                        help='输出路径模板，可用 {dir} {name} {date}，默认 {dir}/text.xlsx')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='递归查找输入目录下所有包含 Excel 文件的子目录，每个子目录一个项目')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='同时合并的项目数，默认使用全部 CPU 核心')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='每个项目并行解析的进程数；单个项目时默认使用全部 CPU 核心，'
+                             '多个项目时默认 1')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用已解析工作簿的磁盘缓存，全部重新解析')
+    parser.add_argument('--columns', nargs='*', metavar='列名', default=None,
+                        help='只读取汇总必需的列和这里列出的透传列')
+    parser.add_argument('--compact', action='store_true',
+                        help='读取时压缩列类型并报告节省的内存')
+    parser.add_argument('--streaming', action='store_true',
+                        help='流式写出结果工作簿，降低大表的内存占用')
+    parser.add_argument('--chunked', action='store_true',
+                        help='分块读取和汇总，内存占用与总行数无关，适合数百万行的大型合并')
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help='分块模式每块的行数，默认 50000')
+    parser.add_argument('--export', choices=['parquet', 'feather'], default=None,
+                        help='另外把合并明细和各汇总表导出为列式文件，目录为输出文件名加 _data')
+    parser.add_argument('--no-excel', action='store_true',
+                        help='不写出 Excel 文件，只导出列式文件（需同时指定 --export）')
+    parser.add_argument('--reader', choices=READERS, default='auto',
+                        help='读取后端：auto（默认）优先使用 calamine，失败或未安装时用 '
+                             'openpyxl/xlrd；calamine、default 只使用对应引擎')
+    parser.add_argument('--materials', metavar='文件',
+                        help='材料目录文件（JSON/YAML），默认使用程序目录下的 materials.json 或内置目录')
+    parser.add_argument('--diff', action='store_true',
+                        help='保存汇总快照并打印与上次合并相比新增、删除和数量变化的规格')
+    parser.add_argument('--metrics', action='store_true',
+                        help='合并完成后打印各阶段、各文件和各工作表的耗时统计')
+    parser.add_argument('--profile', metavar='文件',
+                        help='用 cProfile 分析合并过程并把结果写到该文件')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量合并：只处理上次合并后新增、修改或删除的文件')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视当前目录，Excel 文件变化后自动增量合并，Ctrl+C 退出')
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help='监视模式的轮询间隔（秒）')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='监视模式下目录安静多少秒后才合并')
+    args = parser.parse_args(argv)
+    if args.no_excel and args.export is None:
+        parser.error('--no-excel 需要同时指定 --export')
+    if args.materials:
+        # 通过环境变量传递，批量合并的子进程也使用同一个目录
+        os.environ[CATALOG_PATH_ENV] = os.path.abspath(args.materials)
+    try:
+        load_catalog()
+    except CatalogError as e:
+        print(e)
+        return 1
+
+    from merge_batch import (DEFAULT_OUTPUT_TEMPLATE, discover_jobs, format_results,
+                             output_path_for, run_jobs)
+
+    if args.watch:
+        # 监视模式只处理一个目录
+        if args.recursive or len(args.inputs) > 1 or \
+                (args.inputs and not os.path.isdir(args.inputs[0])):
+            parser.error('--watch 只能指定一个输入目录，且不能与 -r 同时使用')
+        directory = os.path.abspath(args.inputs[0] if args.inputs else os.getcwd())
+        return _watch(args, directory,
+                      output_path_for(directory, args.output or DEFAULT_OUTPUT_TEMPLATE))
+
+    try:
+        jobs = discover_jobs(args.inputs or [os.getcwd()],
+                             args.output or DEFAULT_OUTPUT_TEMPLATE, args.recursive)
+    except ValueError as e:
+        print(e)
+        return 2
+    if not jobs:
+        print("当前目录下未找到Excel文件" if not args.inputs else "输入中未找到Excel文件")
+        return 2
+
+    options = dict(cache=not args.no_cache, columns=args.columns, compact=args.compact,
+                   streaming=args.streaming, incremental=args.incremental, reader=args.reader,
+                   export=args.export, excel=not args.no_excel, chunked=args.chunked,
+                   chunk_rows=args.chunk_rows, diff=args.diff)
+    if len(jobs) > 1:
+        if args.workers is not None:
+            options['workers'] = args.workers
+        results = run_jobs(jobs, max_jobs=args.jobs, **options)
+        print(format_results(results))
+        return 1 if any(result['error'] is not None for result in results) else 0
+
+    excel_files, output_file = jobs[0]['files'], jobs[0]['output']
+    metrics = MergeMetrics() if args.metrics else None
+    try:
+        summary = merge_excel_files(excel_files, output_file, workers=args.workers,
+                                    metrics=metrics, profile_path=args.profile, **options)
+    except Exception as e:
+        print(f"合并过程中发生错误: {str(e)}")
+        return 1
+
+    if not args.no_excel:
+        print(f"合并完成，结果已保存到 {output_file}")
+    if 'export_dir' in summary:
+        print(f"列式文件已导出到 {summary['export_dir']}")
+    if 'incremental' in summary:
+        changes = summary['incremental']
+        print(f"新增 {len(changes['added'])} 个、修改 {len(changes['changed'])} 个、"
+              f"删除 {len(changes['removed'])} 个文件，{changes['unchanged']} 个未变化；"
+              f"重新计算 {len(changes['recomputed'])} 张材料汇总表")
+    if metrics is not None:
+        print(metrics.summary())
+    if summary.get('diff') is not None:
+        from merge_diff import format_report
+        print(format_report(summary['diff']))
+    elif args.diff:
+        print("已保存汇总快照，下次合并后可对比变化")
+    if summary['diagnostics'] is not None:
+        print(f"有 {len(summary['diagnostics'])} 个规格无法解析，详见 '规格异常' 表")
+    if summary['skipped_columns']:
+        print(f"按列读取跳过了 {len(summary['skipped_columns'])} 列："
+              f"{'、'.join(map(str, summary['skipped_columns']))}")
+    if summary['memory_saved'] is not None:
+        print(f"共 {summary['rows']} 行，内存占用 "
+              f"{summary['memory_bytes'] / 1024 / 1024:.1f} MB，"
+              f"压缩列类型节省 {summary['memory_saved'] / 1024 / 1024:.1f} MB")
+    return 0
+
+def _watch(args, directory, output_file):
+    from merge_watch import watch_and_merge
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    def on_merged(summary, seconds):
+        changes = summary['incremental']
+        print(f"[{time.strftime('%H:%M:%S')}] 已更新 {output_file}：{summary['rows']} 行，"
+              f"新增 {len(changes['added'])}、修改 {len(changes['changed'])}、"
+              f"删除 {len(changes['removed'])} 个文件，用时 {seconds:.1f} 秒")
+        if summary.get('diff') is not None:
+            from merge_diff import format_report
+            print(format_report(summary['diff']))
+
+    def on_error(e):
+        print(f"[{time.strftime('%H:%M:%S')}] 合并过程中发生错误: {str(e)}")
+
+    print(f"正在监视 {directory}，按 Ctrl+C 退出")
+    try:
+        watch_and_merge(directory, output_file, interval=args.interval,
+                        debounce=args.debounce, on_merged=on_merged, on_error=on_error,
+                        workers=args.workers, cache=not args.no_cache, columns=args.columns,
+                        compact=args.compact, streaming=args.streaming,
+                        reader=args.reader, export=args.export, excel=not args.no_excel,
+                        diff=args.diff)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
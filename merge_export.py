@@ -0,0 +1,115 @@
+"""把合并明细和各汇总表导出为列式文件（Parquet 或 Feather）
+
+每张输出工作表写成导出目录下的一个文件（'总.parquet'、'基座Y.parquet' 等），
+并写出 manifest.json 记录格式和工作表顺序。下游分析或再次处理时用 load_sheets/read_sheet
+直接读取，不必再解析 Excel，也不受 Excel 单表 1048576 行的限制。
+
+Feather 不压缩，可用内存映射零拷贝读取；Parquet 使用默认的 snappy 压缩，文件更小。
+两种格式都需要安装 pyarrow。
+"""
+import importlib.util
+import json
+import os
+import time
+
+import pandas as pd
+
+from merge_metrics import measure
+
+EXPORT_FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def export_dir_for(output_path):
+    """默认导出目录：输出文件名去掉扩展名后加 '_data'，如 text.xlsx -> text_data"""
+    return os.path.splitext(output_path)[0] + '_data'
+
+
+def check_export_format(fmt):
+    """格式不支持或未安装 pyarrow 时抛出异常，在开始合并前调用"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知的导出格式：{fmt}，可选 {', '.join(EXPORT_FORMATS)}")
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError("导出 Parquet/Feather 需要安装 pyarrow")
+
+
+def _arrow_safe(df):
+    """pyarrow 要求一列只有一种类型，混有数字和文本的 object 列把非空值转为文本"""
+    df = df.reset_index(drop=True)
+    for column in df.columns:
+        if df[column].dtype == object and pd.api.types.infer_dtype(df[column]) in (
+                'mixed', 'mixed-integer', 'mixed-integer-float'):
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def _remove_previous(directory):
+    """删除上次导出的文件，避免这次没有的工作表（如规格异常）残留"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return
+    for sheet in manifest.get('sheets', []):
+        path = os.path.join(directory, sheet['file'])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_columnar(sheets, directory, fmt='parquet', on_sheet=None, metrics=None):
+    """把 [(工作表名, DataFrame), ...] 写到 directory，返回写出的文件路径列表
+
+    on_sheet(df) 在每张表开始写之前调用，可在其中抛出异常中止导出，
+    中止时删除这次已写出的文件。metrics 见 merge_metrics，每张表记录一条 'output'。
+    """
+    check_export_format(fmt)
+    os.makedirs(directory, exist_ok=True)
+    _remove_previous(directory)
+
+    paths = []
+    entries = []
+    try:
+        for name, df in sheets:
+            if on_sheet is not None:
+                on_sheet(df)
+            with measure(metrics, 'output', f'{name}{EXPORT_FORMATS[fmt]}') as stage:
+                file_name = name + EXPORT_FORMATS[fmt]
+                path = os.path.join(directory, file_name)
+                paths.append(path)
+                if fmt == 'feather':
+                    _arrow_safe(df).to_feather(path, compression='uncompressed')
+                else:
+                    _arrow_safe(df).to_parquet(path, index=False)
+                stage['rows'] = len(df)
+            entries.append({'name': name, 'file': file_name, 'rows': len(df)})
+    except BaseException:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    manifest = {'version': MANIFEST_VERSION, 'format': fmt,
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'sheets': entries}
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return paths
+
+
+def read_sheet(directory, name, columns=None, memory_map=True):
+    """读取导出目录中的一张表，Feather 默认用内存映射读取"""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        fmt = json.load(f)['format']
+    path = os.path.join(directory, name + EXPORT_FORMATS[fmt])
+    if fmt == 'feather':
+        from pyarrow import feather
+        return feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    return pd.read_parquet(path, columns=columns, memory_map=memory_map)
+
+
+def load_sheets(directory, memory_map=True):
+    """按导出时的顺序读取全部表，返回 [(工作表名, DataFrame), ...]"""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        manifest = json.load(f)
+    return [(sheet['name'], read_sheet(directory, sheet['name'], memory_map=memory_map))
+            for sheet in manifest['sheets']]
@@ -0,0 +1,111 @@
+"""合并过程的计时与统计
+
+merge_excel_files(metrics=...) 在以下位置调用 metrics.record()：
+    'file'   每个解析的输入文件（bytes_read 为文件大小）
+    'cache'  每个从缓存读取的输入文件
+    'sheet'  每张输入工作表
+    'stage'  read/concat/compact/aggregate/write 等整体阶段
+    'output' 每张写出的工作表，以及保存工作簿（名称为 '保存工作簿'）
+任何实现了 record(kind, name, seconds, rows=None, bytes_read=None, memory_delta=None)
+的对象都可以作为 metrics，MergeMetrics 是默认实现。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+KIND_NAMES = {
+    'stage': '阶段',
+    'file': '解析文件',
+    'cache': '缓存命中',
+    'sheet': '输入工作表',
+    'output': '输出工作表',
+}
+
+
+def current_rss():
+    """当前进程的常驻内存字节数，无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextmanager
+def measure(metrics, kind, name):
+    """计时一段代码并报告给 metrics，metrics 为 None 时不做任何事
+
+    代码块内可以往 yield 出的 dict 中填 rows/bytes_read，正常结束时一并记录。
+    """
+    extra = {}
+    if metrics is None:
+        yield extra
+        return
+    rss_before = current_rss()
+    start = time.perf_counter()
+    yield extra
+    seconds = time.perf_counter() - start
+    rss_after = current_rss()
+    memory_delta = None
+    if rss_before is not None and rss_after is not None:
+        memory_delta = rss_after - rss_before
+    metrics.record(kind, name, seconds, memory_delta=memory_delta, **extra)
+
+
+class MergeMetrics:
+    """记录每一步的耗时、行数、读取字节数和内存变化"""
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, kind, name, seconds, rows=None, bytes_read=None, memory_delta=None):
+        self.records.append({
+            'kind': kind,
+            'name': name,
+            'seconds': seconds,
+            'rows': rows,
+            'bytes_read': bytes_read,
+            'memory_delta': memory_delta,
+        })
+
+    def by_kind(self, kind):
+        return [r for r in self.records if r['kind'] == kind]
+
+    def summary(self, top=5):
+        """返回可直接打印或在界面上显示的多行文本"""
+        lines = []
+        stages = self.by_kind('stage')
+        if stages:
+            lines.append('阶段耗时：')
+            for r in stages:
+                line = f"  {r['name']:<10}{r['seconds']:>8.2f}s"
+                if r['rows'] is not None:
+                    line += f"  {r['rows']} 行"
+                    if r['seconds'] > 0:
+                        line += f"  {r['rows'] / r['seconds']:.0f} 行/秒"
+                if r['memory_delta'] is not None:
+                    line += f"  内存 {r['memory_delta'] / 1024 / 1024:+.1f} MB"
+                lines.append(line)
+
+        for kind in ('file', 'cache', 'sheet', 'output'):
+            records = self.by_kind(kind)
+            if not records:
+                continue
+            seconds = sum(r['seconds'] for r in records)
+            rows = sum(r['rows'] or 0 for r in records)
+            line = f"{KIND_NAMES[kind]}：{len(records)} 个，合计 {seconds:.2f}s，{rows} 行"
+            bytes_read = sum(r['bytes_read'] or 0 for r in records)
+            if bytes_read:
+                line += f"，{bytes_read / 1024 / 1024:.1f} MB"
+            lines.append(line)
+            if kind in ('file', 'output'):
+                for r in sorted(records, key=lambda r: r['seconds'], reverse=True)[:top]:
+                    lines.append(f"  {r['seconds']:>8.2f}s  {os.path.basename(str(r['name']))}")
+        return '\n'.join(lines)
@@ -0,0 +1,154 @@
+"""监视目录，输入文件有新增、修改或删除时自动重新合并
+
+有 watchdog 时用系统文件事件（inotify 等）及时唤醒，否则按固定间隔轮询。
+检测到变化后等待目录安静 debounce 秒再合并，避免一次保存触发多次合并；
+未写完或被 Excel 占用的文件暂不参与合并，之后每轮重新检查。合并使用增量模式和解析缓存，
+只重新解析变化的文件。
+"""
+import os
+import threading
+import time
+import zipfile
+
+from merge_excel import merge_excel_files
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+# .xls（OLE 复合文档）的文件头
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def list_excel_files(directory, exclude=()):
+    """目录下的 Excel 文件，跳过 Excel 打开文件时生成的 '~$' 锁文件和 exclude 中的路径"""
+    exclude = {os.path.normcase(os.path.abspath(path)) for path in exclude}
+    files = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if (name.lower().endswith(EXCEL_EXTENSIONS) and not name.startswith('~$')
+                and os.path.isfile(path)
+                and os.path.normcase(os.path.abspath(path)) not in exclude):
+            files.append(path)
+    return files
+
+
+def snapshot(files):
+    """{路径: (大小, 修改时间)}，文件在扫描过程中被删除时忽略"""
+    result = {}
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        result[path] = (stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def is_file_ready(path):
+    """文件是否已完整写入且未被独占
+
+    .xlsx 需要能读到 zip 中央目录（写到一半的文件没有），.xls 需要 OLE 文件头；
+    Windows 下 Excel 打开文件时不允许以读写方式打开，借此判断是否被占用。
+    """
+    try:
+        if path.lower().endswith('.xlsx'):
+            if not zipfile.is_zipfile(path):
+                return False
+        else:
+            with open(path, 'rb') as f:
+                if f.read(len(OLE_SIGNATURE)) != OLE_SIGNATURE:
+                    return False
+        if os.name == 'nt':
+            with open(path, 'r+b'):
+                pass
+    except OSError:
+        return False
+    return True
+
+
+class _ChangeHandler(FileSystemEventHandler if Observer is not None else object):
+    def __init__(self, event):
+        super().__init__()
+        self.event = event
+
+    def on_any_event(self, event):
+        self.event.set()
+
+
+class DirectoryWatcher:
+    """等待目录发生变化，wait() 在有文件事件或到达轮询间隔时返回"""
+
+    def __init__(self, directory, interval=2.0, use_watchdog=True):
+        self.interval = interval
+        self.changed = threading.Event()
+        self.observer = None
+        if use_watchdog and Observer is not None:
+            self.observer = Observer()
+            self.observer.schedule(_ChangeHandler(self.changed), directory, recursive=False)
+            self.observer.start()
+
+    def wait(self, timeout=None):
+        self.changed.wait(self.interval if timeout is None else timeout)
+        self.changed.clear()
+
+    def close(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+
+def watch_and_merge(directory, output_path, interval=2.0, debounce=2.0, stop=None,
+                    on_merged=None, on_error=None, use_watchdog=True, **merge_options):
+    """持续监视 directory，变化后把其中的 Excel 文件合并到 output_path
+
+    stop 为带 is_set() 的对象，置位后退出；on_merged(summary, seconds) 在每次合并成功后调用，
+    on_error(exception) 在合并失败时调用（不传时抛出）。其余参数传给 merge_excel_files，
+    默认开启增量合并和解析缓存。
+    """
+    merge_options.setdefault('incremental', True)
+    merge_options.setdefault('cache', True)
+    exclude = [output_path]
+    watcher = DirectoryWatcher(directory, interval, use_watchdog)
+    merged = None
+    try:
+        while stop is None or not stop.is_set():
+            current = snapshot(list_excel_files(directory, exclude))
+            if current == merged:
+                watcher.wait()
+                continue
+
+            # 等目录安静 debounce 秒，连续保存只触发一次合并
+            quiet_since = time.monotonic()
+            while time.monotonic() - quiet_since < debounce:
+                if stop is not None and stop.is_set():
+                    return
+                watcher.wait(min(interval, debounce))
+                latest = snapshot(list_excel_files(directory, exclude))
+                if latest != current:
+                    current = latest
+                    quiet_since = time.monotonic()
+
+            # 未写完或被占用的文件这次先不合并，等它再次变化或就绪后再处理
+            ready = {path: stat for path, stat in current.items()
+                     if (merged is not None and merged.get(path) == stat) or is_file_ready(path)}
+            if ready == merged:
+                watcher.wait()
+                continue
+
+            start = time.monotonic()
+            try:
+                if ready:
+                    summary = merge_excel_files(list(ready), output_path, **merge_options)
+                    if on_merged is not None:
+                        on_merged(summary, time.monotonic() - start)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+            merged = ready
+    finally:
+        watcher.close()